@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from typing import Any
+
+import manim_helper
+
+
+# name: (objects, group size, controller depth, sections)
+sizes = {
+    'small': (50, 5, 2, 2),
+    'medium': (500, 10, 3, 4),
+    'large': (5000, 20, 4, 8)
+}
+
+
+def generate_script(objects: int, group_size: int = 10) -> dict[str, Any]:
+    '''
+    A synthetic script: indexed texts and circles (`3.word`), a surrounding rectangle
+    referencing every tenth object with `$`, `move_to` chains and one group per
+    `group_size` objects (`2.word-group`)
+    '''
+    script: dict[str, Any] = {}
+    for i in range(1, objects + 1):
+        if i % 4 == 0:
+            script[f'{i}.word'] = {
+                'type': 'circle', 'properties': { 'radius': 0.1 }, 'color': 'BLUE', 'shift': 'RIGHT*{}*0.05'
+            }
+        else:
+            script[f'{i}.word'] = { 'value': f'w{i}', 'scale': 0.5, 'shift': 'RIGHT*{}*0.05' }
+        if i % 5 == 0:
+            script[f'{i}.word']['move_to'] = f'word_{i - 1}'
+        if i % 10 == 0:
+            script[f'{i}.frame'] = { 'type': 'surroundingRectangle', 'value': f'$word_{i}' }
+
+    for g, start in enumerate(range(1, objects + 1, group_size), 1):
+        script[f'{g}.word-group'] = [f'word_{i}' for i in range(start, min(start + group_size, objects + 1))]
+    return script
+
+
+def _controller(names: list[int], depth: int) -> dict[str, Any]:
+    # Alternates parallel and lagged controllers, leaves select a range of objects
+    if depth == 0 or len(names) < 2:
+        return {
+            'action': 'select', 'target': 'word_{}', 'params': f'range({names[0]}, {names[-1] + 1})',
+            'properties': { 'action': 'write' }
+        }
+    half = len(names) // 2
+    children = [_controller(names[:half], depth - 1), _controller(names[half:], depth - 1)]
+    if depth % 2:
+        return { 'action': 'lagged', 'params': children, 'properties': { 'ratio': 0.1 } }
+    return { 'action': 'parallel', 'params': children }
+
+
+def generate_actions(objects: int, group_size: int = 10, depth: int = 2, sections: int = 2) -> dict[str, Any]:
+    '''
+    Synthetic actions for `generate_script`: every section writes its share of objects
+    through nested controllers `depth` levels deep, moves and scales its groups, then
+    fades everything out
+    '''
+    actions: dict[str, Any] = {}
+    per_section = max(1, objects // sections)
+    for s in range(sections):
+        names = list(range(s * per_section + 1, min((s + 1) * per_section, objects) + 1))
+        if not names:
+            break
+        groups = sorted({ (i - 1) // group_size + 1 for i in names })
+        actions[f'section-{s + 1}'] = [
+            _controller(names, depth),
+            {
+                'action': 'parallel',
+                'params': [{ 'action': 'shift', 'target': f'word_group_{g}', 'params': ['UP*0.1'] } for g in groups]
+            },
+            { 'action': 'scale', 'target': f'word_group_{groups[0]}', 'params': [1.2], 'duration': 0.5 },
+            { 'action': 'wait', 'params': [0.1] },
+            {
+                'action': 'select', 'target': 'word_{}', 'params': f'range({names[0]}, {names[-1] + 1})',
+                'properties': { 'action': 'fadeout' }
+            }
+        ]
+    return actions
+
+
+def write_case(directory: str, name: str, objects: int, group_size: int, depth: int, sections: int) -> tuple[str, str]:
+    script = os.path.join(directory, f'{name}_script.json')
+    actions = os.path.join(directory, f'{name}_actions.json')
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(generate_script(objects, group_size)))
+    with open(actions, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(generate_actions(objects, group_size, depth, sections)))
+    return script, actions
+
+
+def _has_manim() -> bool:
+    try:
+        manim_helper._manim()
+    except ImportError:
+        return False
+    return True
+
+
+def _render(director: manim_helper.Director, manager: manim_helper.MObjectManager, mode: str, media_dir: str) -> None:
+    manim = manim_helper._manim()
+
+    def construct(scene: Any) -> None:
+        played = director.fork(manager.fork())
+        played.set_target_show(scene)
+        played.start_play()
+
+    scene_class = type('BenchmarkScene', (manim.Scene,), { 'construct': construct })
+    with manim.tempconfig({
+        'quality': 'low_quality',
+        'preview': False,
+        'media_dir': media_dir,
+        'disable_caching': True,
+        'skip_animations': mode == 'skip',
+        'write_to_movie': mode == 'full'
+    }):
+        scene_class().render()
+
+
+def run_case(script: str, actions: str, render: str = 'none', media_dir: str | None = None) -> dict[str, float | None]:
+    '''
+    Seconds spent in each phase of one run, `None` for phases that were skipped:
+
+        load    reading and parsing the script
+        build   registering and constructing every object (skipped without manim)
+        plan    reading the actions and compiling the plan
+        render  playing the plan, `skip` uses manim's skip-animations mode
+    '''
+    manim_helper.expression_engine.clear()
+    built = _has_manim()
+    result: dict[str, float | None] = {}
+
+    st = time.perf_counter()
+    loader = manim_helper.TextLoader(script)
+    content = loader.load()
+    result['load'] = time.perf_counter() - st
+
+    st = time.perf_counter()
+    manager = loader.apply(content, lazy=not built)
+    result['build'] = time.perf_counter() - st if built else None
+
+    st = time.perf_counter()
+    director = manim_helper.Director(manager, actions)
+    director.load_actions()
+    director.compile()
+    result['plan'] = time.perf_counter() - st
+
+    result['render'] = None
+    if render != 'none' and built:
+        st = time.perf_counter()
+        _render(director, manager, render, media_dir or tempfile.mkdtemp(prefix='manim_bench_'))
+        result['render'] = time.perf_counter() - st
+    return result
+
+
+def run(names: list[str], repeat: int = 3, render: str = 'none', directory: str | None = None, quiet: bool = True) -> dict[str, dict[str, float | None]]:
+    '''
+    Best time of every phase over `repeat` runs, for each size in `names`
+    '''
+    directory = directory or tempfile.mkdtemp(prefix='manim_bench_')
+    os.makedirs(directory, exist_ok=True)
+    results = {}
+    for name in names:
+        script, actions = write_case(directory, name, *sizes[name])
+        runs = []
+        for _ in range(repeat):
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull if quiet else sys.stderr):
+                runs.append(run_case(script, actions, render, os.path.join(directory, 'media')))
+        results[name] = {
+            phase: None if runs[0][phase] is None else min(r[phase] for r in runs) for phase in runs[0]
+        }
+    return results
+
+
+def compare(results: dict[str, dict[str, float | None]], baseline: dict[str, dict[str, float | None]], tolerance: float) -> list[str]:
+    '''
+    Phases slower than the baseline by more than `tolerance` (a ratio, 0.25 = 25%)
+    '''
+    regressions = []
+    for name, phases in results.items():
+        for phase, seconds in phases.items():
+            reference = baseline.get(name, {}).get(phase)
+            if seconds is None or not reference:
+                continue
+            if seconds > reference * (1 + tolerance):
+                regressions.append(f'{name}.{phase}: {seconds:.4f}s，基准 {reference:.4f}s（+{(seconds / reference - 1) * 100:.1f}%）')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='manim-helper benchmarks on synthetic scripts')
+    parser.add_argument('sizes', nargs='*', metavar='SIZE', help=f'cases to run among {", ".join(sizes)} (default: small medium, none with a custom case)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best one is kept')
+    parser.add_argument('--objects', type=int, metavar='N', help='run a custom case with N objects')
+    parser.add_argument('--group-size', type=int, metavar='N', help='objects per group of the custom case')
+    parser.add_argument('--depth', type=int, metavar='N', help='controller nesting depth of the custom case')
+    parser.add_argument('--sections', type=int, metavar='N', help='action sections of the custom case')
+    parser.add_argument(
+        '--render', choices=('none', 'skip', 'full'), default='none',
+        help='also time rendering, `skip` uses manim skip-animations (no frames are drawn)'
+    )
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a previous --save-baseline')
+    parser.add_argument('--save-baseline', metavar='FILE', help='store the results as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--keep', metavar='DIR', help='write the generated cases to DIR')
+    parser.add_argument('--verbose', action='store_true', help='keep the helper output on stderr')
+    args = parser.parse_args()
+    unknown = [name for name in args.sizes if name not in sizes]
+    if unknown:
+        parser.error(f'unknown size: {", ".join(unknown)}')
+    names = args.sizes or ['small', 'medium']
+    custom = (args.objects, args.group_size, args.depth, args.sections)
+    if any(value is not None for value in custom):
+        # Unset values come from `medium`, the name keeps baselines of different cases apart
+        case = tuple(sizes['medium'][i] if value is None else value for i, value in enumerate(custom))
+        if min(case[0], case[1], case[3]) < 1 or case[2] < 0:
+            parser.error('--objects, --group-size and --sections must be positive, --depth at least 0')
+        sizes['custom-{}-{}-{}-{}'.format(*case)] = case
+        names = [*args.sizes, 'custom-{}-{}-{}-{}'.format(*case)]
+
+    if not _has_manim():
+        sys.stderr.write('未安装 manim：跳过 build 与 render 阶段\n')
+    results = run(names, args.repeat, args.render, args.keep, not args.verbose)
+    for name, phases in results.items():
+        print(f'{name}: ' + '，'.join(
+            f'{phase} {"-" if seconds is None else f"{seconds * 1000:.2f} ms"}' for phase, seconds in phases.items()
+        ))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(results, indent=4))
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.loads(f.read()), args.tolerance)
+        for regression in regressions:
+            sys.stderr.write(f'性能退化：{regression}\n')
+        exit(1 if regressions else 0)
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import ipaddress
+import threading
+import socketserver
+import multiprocessing
+from typing import Any, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Warm sessions of the current worker process, keyed by project
+_sessions: dict[tuple[str, str, str, str, str], Any] = {}
+
+
+def _warm_up() -> None:
+    # Pay for the manim import once per worker instead of once per job
+    import manim
+    import manim_helper
+    import manim_render
+
+
+def _render_job(job: dict[str, Any], events: Any) -> dict[str, Any]:
+    import manim_render
+
+    st = time.time()
+    config = job.get('config', {})
+    key = (
+        job['scene'], os.path.abspath(job['script']), os.path.abspath(job['actions']),
+        config.get('quality', 'low_quality'), config.get('media_dir', 'media')
+    )
+    session = _sessions.get(key)
+    if session is None:
+        session = _sessions[key] = manim_render.WarmSession(
+            job['scene'], key[1], key[2], quality=key[3], media_dir=key[4],
+            object_cache=config.get('object_cache')
+        )
+
+    changes = session.refresh()
+    objects, sections = changes if changes is not None else (set(), [])
+    events.put({ 'event': 'loaded', 'objects': len(objects), 'sections': len(sections) })
+    events.put({ 'event': 'rendering' })
+    output = session.render()
+    return { 'event': 'done', 'output': output, 'seconds': round(time.time() - st, 3) }
+
+
+class RenderDaemon:
+    '''
+    Long-lived render service, jobs arrive as one json line per connection:
+
+        { "scene": ..., "script": ..., "actions": ..., "config": { "quality": ..., "media_dir": ... } }
+
+    and every connection receives json lines of progress events until `done` or `error`
+    '''
+
+    def __init__(self, workers: int = 1, max_pending: int = 16) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Workers must not be forked from the threaded server, a fork could copy a held lock
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._events = context.Manager()
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up, mp_context=context)
+
+    def handle(self, job: dict[str, Any], send: Any) -> None:
+        missing = [k for k in ('scene', 'script', 'actions') if k not in job]
+        if missing:
+            send({ 'event': 'error', 'message': f'Missing {", ".join(missing)}' })
+            return
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                send({ 'event': 'error', 'message': 'Render queue is full' })
+                return
+            self._pending += 1
+            position = self._pending
+
+        try:
+            send({ 'event': 'queued', 'position': position })
+            events = self._events.Queue()
+            future = self._pool.submit(_render_job, job, events)
+            while not future.done() or not events.empty():
+                try:
+                    send(events.get(timeout=0.2))
+                except queue.Empty:
+                    pass
+            try:
+                send(future.result())
+            except Exception as e:
+                send({ 'event': 'error', 'message': f'{type(e).__name__}: {e}' })
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def serve(self, address: str | tuple[str, int]) -> None:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self) -> None:
+                def send(event: dict[str, Any]) -> None:
+                    self.wfile.write((json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+
+                try:
+                    job = json.loads(self.rfile.readline().decode('utf-8'))
+                except json.JSONDecodeError as e:
+                    send({ 'event': 'error', 'message': f'Invalid job: {e}' })
+                    return
+                daemon.handle(job, send)
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            if not is_loopback(address[0]):
+                raise ValueError(f'`{address[0]}` is not a loopback address, the daemon only accepts local connections')
+            server = socketserver.ThreadingTCPServer(address, Handler)
+        server.daemon_threads = True
+
+        sys.stderr.write(f'渲染服务已启动：{address}，{self.workers} 个进程\n')
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self._pool.shutdown(cancel_futures=True)
+            if isinstance(address, str) and os.path.exists(address):
+                os.remove(address)
+
+
+def submit(address: str | tuple[str, int], job: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    '''
+    Sends a job to a running daemon and yields its progress events
+    '''
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall((json.dumps(job) + '\n').encode('utf-8'))
+        with connection.makefile('r', encoding='utf-8') as stream:
+            for line in stream:
+                event = json.loads(line)
+                yield event
+                if event['event'] in ('done', 'error'):
+                    return
+
+
+def is_loopback(host: str) -> bool:
+    # True when every address `host` resolves to stays on this machine
+    try:
+        addresses = { info[4][0] for info in socket.getaddrinfo(host, None) }
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
+
+
+def parse_address(value: str) -> str | tuple[str, int]:
+    '''
+    `host:port` (or a bare port) listens on TCP, anything else is a unix socket path
+
+    Jobs run the expressions of their scripts, so TCP is limited to loopback hosts
+    '''
+    host, _, port = value.rpartition(':')
+    if port.isdigit() and '/' not in value:
+        host = host.strip('[]') or '127.0.0.1'
+        if not is_loopback(host):
+            raise ValueError(f'`{host}` is not a loopback address, the daemon only accepts local connections')
+        return host, int(port)
+    return value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='manim-helper render daemon')
+    parser.add_argument('--listen', default='manim_helper.sock', help='unix socket path or [host:]port (loopback hosts only)')
+    parser.add_argument('--workers', type=int, default=1, help='concurrent renders')
+    parser.add_argument('--max-pending', type=int, default=16, help='jobs accepted before new ones are rejected')
+    args = parser.parse_args()
+
+    try:
+        address = parse_address(args.listen)
+    except ValueError as e:
+        sys.stderr.write(f'无法启动渲染服务：{e}\n')
+        exit(1)
+    RenderDaemon(args.workers, args.max_pending).serve(address)
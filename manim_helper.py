@@ -1,18 +1,384 @@
+from __future__ import annotations
+
+import os
 import sys
+import copy
 import json
+import mmap
+import pickle
+import hashlib
+import tempfile
+import builtins
+import math
+import re
+import time
+import heapq
+import itertools
+import string
 import warnings
-from typing import Any
-from dataclasses import dataclass
-# Just allow eval() to access
-from math import *
+from types import CodeType
+from typing import Any, Iterable, TYPE_CHECKING
+from collections import OrderedDict
+from dataclasses import dataclass, field
 
-from manim import *
-# Just allow eval() to access
-import numpy as np
+from manim_trace import tracer
 
+if TYPE_CHECKING:
+    from manim import Animation, Axes, Mobject, Scene, VMobject
+
+
+# manim and numpy are imported on first use only, so loading scripts, naming and
+# validating actions works (fast) without them
+
+
+def _manim() -> Any:
+    import manim
+    return manim
+
+
+def _numpy() -> Any:
+    import numpy
+    return numpy
+
+
+def __getattr__(name: str) -> Any:
+    # `manim_helper.CENTER` and the manim names this module used to re-export
+    if name == 'CENTER':
+        return _numpy().array([0, 0, 0])
+    if not name.startswith('_'):
+        try:
+            return getattr(_manim(), name)
+        except (ImportError, AttributeError):
+            pass
+    raise AttributeError(f'module \'{__name__}\' has no attribute \'{name}\'')
+
+
+def read_records(path: str) -> Iterable[tuple[str, Any]]:
+    '''
+    Yields the `(key, value)` pairs of a json object file one by one
+
+    `.jsonl` / `.ndjson` files hold one json object per line (usually a single object
+    definition or action section), they are read line by line so the whole file is
+    never in memory at once
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        if not path.endswith(('.jsonl', '.ndjson')):
+            content = json.loads(f.read())
+            if not isinstance(content, dict):
+                raise ValueError('the file should contain a json object')
+            yield from content.items()
+            return
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'line {number}: {e}') from e
+            if not isinstance(record, dict):
+                raise ValueError(f'line {number}: a record should be a json object')
+            yield from record.items()
+
+
+class ManimName:
+    '''
+    Stands for a manim class in the tables below, manim is imported when it is first called
+    '''
+    __slots__ = ('name',)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def resolve(self) -> Any:
+        return getattr(_manim(), self.name)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+class ExpressionEngine:
+    '''
+    Compiles the expression strings found in scripts and actions once and
+    evaluates them against a fixed namespace (manim, numpy and math)
+
+    Compiled code objects are kept in a bounded LRU cache keyed by source
+    '''
+    class ExpressionException(Exception):
+        pass
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._codes: OrderedDict[str, CodeType] = OrderedDict()
+        self._templates: OrderedDict[str, tuple[str, int] | None] = OrderedDict()
+        self._namespace: dict[str, Any] | None = None
+        self._complete = False
+
+    @staticmethod
+    def prepare_namespace(complete: bool = True) -> dict[str, Any]:
+        namespace = { k: v for k, v in vars(math).items() if not k.startswith('_') }
+        if complete:
+            np = _numpy()
+            namespace.update({ k: v for k, v in vars(_manim()).items() if not k.startswith('_') })
+            namespace.update({ 'np': np, 'numpy': np, 'CENTER': np.array([0, 0, 0]) })
+        return namespace
+
+    @property
+    def namespace(self) -> dict[str, Any]:
+        if self._namespace is None or not self._complete:
+            self._namespace = ExpressionEngine.prepare_namespace()
+            self._complete = True
+        return self._namespace
+
+    def _namespace_for(self, code: CodeType, local: dict[str, Any] | None = None) -> dict[str, Any]:
+        # Expressions which only need math and builtins (e.g. `range(1, 4)` in a selection)
+        # are evaluated without importing manim
+        if self._complete:
+            return self._namespace
+        if self._namespace is None:
+            self._namespace = ExpressionEngine.prepare_namespace(complete=False)
+
+        def names(c: CodeType) -> Iterable[str]:
+            yield from c.co_names
+            for const in c.co_consts:
+                if isinstance(const, CodeType):
+                    yield from names(const)
+
+        local = local or {}
+        if all(name in self._namespace or name in local or name in vars(builtins) for name in names(code)):
+            return self._namespace
+        return self.namespace
+
+    def compile(self, expr: str) -> CodeType:
+        code = self._codes.get(expr)
+        if code is not None:
+            self.hits += 1
+            self._codes.move_to_end(expr)
+            return code
+
+        self.misses += 1
+        try:
+            code = compile(expr, '<manim-helper>', 'eval')
+        except SyntaxError as e:
+            raise ExpressionEngine.ExpressionException(
+                f'Invalid expression `{expr}`: {e.msg}'
+            ) from e
+
+        self._codes[expr] = code
+        if len(self._codes) > self.capacity:
+            self._codes.popitem(last=False)
+        return code
+
+    def evaluate(self, expr: str, local: dict[str, Any] | None = None) -> Any:
+        code = self.compile(expr)
+        return eval(code, self._namespace_for(code, local), local)
+
+    def _parametrize(self, template: str) -> tuple[str, int] | None:
+        # Rewrite `RIGHT*{}` as `RIGHT*(__arg0__)` so that one code object serves every index,
+        # fields glued to names, numbers or attribute access keep the plain `str.format` path
+        if template in self._templates:
+            self._templates.move_to_end(template)
+            return self._templates[template]
+
+        def glued(c: str) -> bool:
+            return c.isalnum() or c in '_.'
+
+        result = None
+        try:
+            if '\'' in template or '"' in template:
+                raise ValueError(template)
+            parts, count = [], 0
+            for literal, field, spec, conversion in string.Formatter().parse(template):
+                if parts and literal and glued(literal[0]):
+                    raise ValueError(literal)
+                parts.append(literal)
+                if field is None:
+                    continue
+                if field not in ('', str(count)) or spec or conversion or (literal and glued(literal[-1])):
+                    raise ValueError(field)
+                parts.append(f'(__arg{count}__)')
+                count += 1
+            source = ''.join(parts)
+            compile(source, '<manim-helper>', 'eval')
+            result = source, count
+        except (ValueError, SyntaxError):
+            pass
+
+        self._templates[template] = result
+        if len(self._templates) > self.capacity:
+            self._templates.popitem(last=False)
+        return result
+
+    def evaluate_template(self, template: str, *args: str, local: dict[str, Any] | None = None) -> Any:
+        '''
+        Equivalent to `evaluate(template.format(*args))`, but compiles the template only once
+        as long as every argument is a plain integer literal
+        '''
+        parametrized = self._parametrize(template)
+        if parametrized is None or parametrized[1] != len(args) or not all(str(a).isdigit() for a in args):
+            return self.evaluate(template.format(*args), local)
+
+        source, _ = parametrized
+        bound = { f'__arg{i}__': int(a) for i, a in enumerate(args) }
+        if local:
+            bound.update(local)
+        return self.evaluate(source, bound)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._codes),
+            'capacity': self.capacity
+        }
+
+    def clear(self) -> None:
+        self._codes.clear()
+        self._templates.clear()
+        self.hits = self.misses = 0
+
+
+expression_engine = ExpressionEngine()
+
+
+class MObjectCache:
+    '''
+    Content addressed on-disk cache of constructed text-like mobjects
+
+    An entry keeps the points, colors and stroke widths of every family member in a
+    single `.npy` file (memory-mapped on load) next to a small json index, entries are
+    evicted least recently used first once the cache grows beyond `max_bytes`
+    '''
+    cacheable_types = ('text', 'markupText', 'mathTex', 'tex')
+
+    def __init__(self, directory: str = '.manim_helper_cache/objects', max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bytes in the directory, counted once and kept up to date by `store`
+        self._size: int | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(type_name: str, value: Any, properties: dict[str, Any]) -> str:
+        manim = _manim()
+        environment = { 'manim': getattr(manim, '__version__', '') }
+        if type_name in ('mathTex', 'tex'):
+            environment['tex_template'] = manim.config.tex_template.body
+        content = json.dumps(
+            { 'type': type_name, 'value': value, 'properties': properties, 'environment': environment },
+            sort_keys=True, default=repr
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.directory, f'{key}.npy'), os.path.join(self.directory, f'{key}.json')
+
+    def load(self, key: str) -> VMobject | None:
+        np, VMobject = _numpy(), _manim().VMobject
+        data_path, index_path = self._paths(key)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.loads(f.read())
+            data = np.load(data_path, mmap_mode='r')
+
+            family: list[VMobject] = []
+            for meta in index['family']:
+                node = VMobject()
+                chunks = {}
+                for field, (start, shape) in meta['arrays'].items():
+                    size = int(np.prod(shape))
+                    chunks[field] = np.array(data[start:start + size]).reshape(shape)
+                node.set_points(chunks['points'])
+                node.fill_rgbas = chunks['fill_rgbas']
+                node.stroke_rgbas = chunks['stroke_rgbas']
+                node.stroke_width = meta['stroke_width']
+                if meta['parent'] >= 0:
+                    family[meta['parent']].add(node)
+                family.append(node)
+            os.utime(index_path)
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            # Missing, truncated or corrupt entries are rebuilt
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return family[0]
+
+    def store(self, key: str, mobject: Mobject) -> None:
+        np = _numpy()
+        if not isinstance(mobject, _manim().VMobject):
+            return
+
+        family = mobject.get_family()
+        position = { id(m): i for i, m in enumerate(family) }
+        parents = { id(c): position[id(m)] for m in family for c in m.submobjects }
+        chunks, index, offset = [], [], 0
+        for m in family:
+            arrays = {}
+            for field in ('points', 'fill_rgbas', 'stroke_rgbas'):
+                array = np.asarray(getattr(m, field, np.zeros((0, 4))), dtype=np.float64)
+                arrays[field] = (offset, list(array.shape))
+                chunks.append(array.ravel())
+                offset += array.size
+            index.append({
+                'parent': parents.get(id(m), -1),
+                'stroke_width': float(np.asarray(m.stroke_width).ravel()[0]) if np.size(m.stroke_width) else 0.0,
+                'arrays': arrays
+            })
+
+        data_path, index_path = self._paths(key)
+        # Unique temporary files, several renders may store the same entry at once
+        data_fd, data_temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(data_fd, 'wb') as f:
+            np.save(f, np.concatenate(chunks) if chunks else np.zeros(0))
+        index_fd, index_temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(index_fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({ 'family': index }))
+        os.replace(data_temporary, data_path)
+        os.replace(index_temporary, index_path)
+
+        if self._size is None:
+            self.evict()
+        else:
+            self._size += os.path.getsize(data_path) + os.path.getsize(index_path)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            data_path, index_path = self._paths(key)
+            try:
+                size = os.path.getsize(data_path) + os.path.getsize(index_path)
+                entries.append((os.path.getmtime(index_path), size, key))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        self._size = total
+
+    def stats(self) -> dict[str, int]:
+        return { 'hits': self.hits, 'misses': self.misses }
 
-CENTER = np.array([0, 0, 0])
-    
 
 class MObjectManager:
 
@@ -21,7 +387,7 @@ class MObjectManager:
 
     @staticmethod
     def _mobject_shift(_: 'MObjectManager', o: Mobject, v: str, t: str) -> None:
-        o.shift(eval(v.format(t.split('_')[-1])))
+        o.shift(expression_engine.evaluate_template(v, t.split('_')[-1]))
 
     @staticmethod
     def _mobject_color(_: 'MObjectManager', o: Mobject, v: str, __: str) -> None:
@@ -32,145 +398,788 @@ class MObjectManager:
         if isinstance(v, (int, float)):
             o.scale(v)
         else:
-            o.scale(eval(v))
+            o.scale(expression_engine.evaluate(v))
 
     @staticmethod
     def _mobject_rotate(_: 'MObjectManager', o: Mobject, v: float | int | str, __: str) -> None:
         if isinstance(v, (int, float)):
             o.rotate(v)
         else:
-            o.rotate(eval(v))
+            o.rotate(expression_engine.evaluate(v))
 
     @staticmethod
     def _mobject_move_to(m: 'MObjectManager', o: Mobject, d: str, _: str) -> None:
         o.move_to(m.get_object(d))
 
     @staticmethod
-    def _mobject_associate(m: 'MObjectManager', o: Mobject, f: str, _: str) -> None:
-        o.add_updater(eval(f'lambda this: {f}'))
+    def _mobject_associate(m: 'MObjectManager', o: Mobject, f: str, t: str) -> None:
+        o.add_updater(m.compile_updater(t, f))
 
     @staticmethod
-    def _mobject_associate_value(m: 'MObjectManager', o: Mobject, f: str, _: str) -> None:
-        expr = f'this.set_value(this.find(\"{f.split(".")[0]}\").{"".join(f.split(".")[1:])})'
-        sys.stderr.write(expr)
-        o.add_updater(eval(f'lambda this: {expr}'))
+    def _mobject_associate_value(m: 'MObjectManager', o: Mobject, f: str, t: str) -> None:
+        # `"associate_value": "tracker.get_value()"` follows the value of another object
+        source, _, attribute = f.partition('.')
+        o.add_updater(m.compile_updater(t, attribute, [source]))
 
     @staticmethod
     def _mobject_add_coord(m: 'MObjectManager', o: Axes, f: str, _: str) -> None:
         if f:
             o.add_coordinates()
 
+    @staticmethod
+    def _mobject_family(m: 'MObjectManager', o: Mobject, f: list[Any], _: str) -> None:
+        # Member `row` of family `f[0]`, placed from the layout computed once for the whole family
+        family, row = f
+        layout = m.family_layout(family)
+        o.move_to(layout['positions'][row])
+        if 'scales' in layout:
+            o.scale(layout['scales'][row])
+        if 'colors' in layout:
+            o.set_color(_manim().rgb_to_color(layout['colors'][row]))
+
     supported_attributes = {}
-    value_optional_types = ('circle', 'axes', 'triangle', 'arrow', 'stealthTip', 'line', 'numberPlane')
+    value_optional_types = ('circle', 'axes', 'triangle', 'arrow', 'stealthTip', 'line', 'numberPlane', 'dot')
+    family_layouts = ('grid', 'line', 'circle', 'coords')
+
+    class Entry:
+        '''
+        Registry record of a single object: its raw script definition, the built mobject and the build state
+        '''
+        __slots__ = ('name', 'definition', 'mobject', 'state')
+
+        DEFINED = 'defined'
+        BUILDING = 'building'
+        BUILT = 'built'
+        # Dropped after its last use (see `Director.analyze_liveness`)
+        RELEASED = 'released'
+
+        def __init__(self, name: str, definition: Any) -> None:
+            self.name = name
+            self.definition = definition
+            self.mobject: Any = None
+            self.state = MObjectManager.Entry.DEFINED
+
+        @property
+        def value(self) -> Any:
+            return self.mobject if self.state == MObjectManager.Entry.BUILT else self.definition
+
+        def __repr__(self) -> str:
+            return f'<Entry {self.name} ({self.state})>'
+
+    class Updater:
+        '''
+        A compiled `associate` expression, objects it finds by name (`this.find("name")`)
+        are resolved once and passed in as arguments instead of being looked up every frame
+
+        With `shared`, the expression is an attribute of a single source object whose value
+        is computed once per tracker state for every updater following it (`associate_value`)
+        '''
+        __slots__ = ('name', 'function', 'references', 'objects', 'manager', 'shared', 'calls', 'seconds')
+
+        def __init__(self, manager: 'MObjectManager', name: str, function: Any, references: list[str], shared: Any = None) -> None:
+            self.name = name
+            self.function = function
+            self.references = references
+            self.objects: list[Any] | None = None
+            self.manager = manager
+            self.shared = shared
+            self.calls = 0
+            self.seconds = 0.0
+
+        def resolve(self) -> list[Any]:
+            self.objects = self.manager.get_objects(self.references)
+            return self.objects
+
+        def _apply(self, this: Any, objects: list[Any]) -> Any:
+            if self.shared is not None:
+                return this.set_value(self.shared(objects[0]))
+            return self.function(this, *objects)
+
+        def __call__(self, this: Any) -> Any:
+            objects = self.objects if self.objects is not None else self.resolve()
+            if not tracer.enabled:
+                return self._apply(this, objects)
+
+            st = time.perf_counter()
+            try:
+                return self._apply(this, objects)
+            finally:
+                elapsed = time.perf_counter() - st
+                self.calls += 1
+                self.seconds += elapsed
+                tracer.record(self.name, 'updater', st, elapsed)
+
+        def __deepcopy__(self, memo: dict[int, Any]) -> 'MObjectManager.Updater':
+            # Forking the manager points the copy at the forked objects, copying a single
+            # mobject (`Mobject.copy`) keeps following the original ones
+            forked = id(self.manager) in memo
+            result = MObjectManager.Updater(
+                copy.deepcopy(self.manager, memo) if forked else self.manager,
+                self.name, self.function, self.references, self.shared
+            )
+            memo[id(self)] = result
+            if forked and self.objects is not None:
+                result.objects = copy.deepcopy(self.objects, memo)
+            else:
+                result.objects = self.objects
+            return result
+
+    class SharedValue:
+        '''
+        Last value of an attribute expression per source state (the points of a value tracker)
+        '''
+        __slots__ = ('function', 'state', 'value')
+
+        def __init__(self, function: Any) -> None:
+            self.function = function
+            self.state: bytes | None = None
+            self.value: Any = None
+
+        def __call__(self, source: Any) -> Any:
+            if not isinstance(source, _manim().ValueTracker):
+                return self.function(source)
+            state = source.points.tobytes()
+            if state != self.state:
+                self.value = self.function(source)
+                self.state = state
+            return self.value
+
+    def __init__(self, lazy: bool = False, cache: MObjectCache | None = None) -> None:
+        # A lazy manager keeps definitions until an object is first requested
+        self.lazy = lazy
+        self.cache = cache
+        # Bumped whenever the set of definitions changes
+        self.revision = 0
+        self._objects: dict[str, MObjectManager.Entry] = {}
+        # family name -> member positions, scales and colors (see `layout`)
+        self._layouts: dict[str, dict[str, Any]] = {}
+        self._updaters: list[MObjectManager.Updater] = []
+        # (source, attribute expression) -> value shared by `associate_value` updaters
+        self._shared: dict[tuple[str, str], MObjectManager.SharedValue] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        # Keeps `manager.<name>` access working for registered objects
+        objects = self.__dict__.get('_objects')
+        if objects is not None and name in objects:
+            return self.get_object(name)
+        raise AttributeError(
+            f'\'{type(self).__name__}\' object has no attribute \'{name}\''
+        )
 
-    def __init__(self) -> None:
-        self._objects: list[str] = []
+    def __contains__(self, name: str) -> bool:
+        return name in self._objects
 
-    def get_object(self, name: str) -> Any:
-        if name not in self._objects:
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def names(self) -> list[str]:
+        return list(self._objects)
+
+    def get_entry(self, name: str) -> 'MObjectManager.Entry':
+        try:
+            return self._objects[name]
+        except KeyError:
             raise MObjectManager.InvalidObjectException(
                 f'Cannot find object "{name}"'
+            ) from None
+
+    def get_object(self, name: str) -> Any:
+        entry = self.get_entry(name)
+        if entry.state == MObjectManager.Entry.RELEASED:
+            raise MObjectManager.InvalidObjectException(
+                f'Object "{name}" has been released after its last use'
             )
-        return getattr(self, name)
+        if self.lazy and entry.state != MObjectManager.Entry.BUILT:
+            return self.build_object(name)
+        return entry.value
+
+    def get_objects(self, names: Iterable[str]) -> list[Any]:
+        return [self.get_object(name) for name in names]
 
     def add_object(self, name: str, value: Any) -> None:
         if name in self._objects:
             raise MObjectManager.InvalidObjectException(
                 f'Object `{name}` already exists'
             )
-        
-        setattr(self, name, value)
-        self._objects.append(name)
-
-    def update_attributes(self) -> None:
-        for attr in self._objects:
-            value = getattr(self, attr)
-            if isinstance(value, str):
-                setattr(self, attr, Text(value))
-
-            def process_dict(value, apply: bool = True) -> None | Any:
-                val = None
-                if 'type' not in value:
-                    value['type'] = 'text'
-                if 'value' not in value and value['type'] not in MObjectManager.value_optional_types:
-                    raise MObjectManager.InvalidObjectException(
-                        f'Object `{attr}` should has an value'
-                    )
 
-                try:
-                    real_val: Any | None
-                    if 'value' in value:
-                        real_val = value['value']
-                        if isinstance(value['value'], str):
-                            v = value['value']
-                            if v.startswith('$'):
-                                real_val = getattr(self, v.lstrip('$'))
-                            elif v.startswith('%'):
-                                allow_access = len(v.split('.')) > 1
-                                try:
-                                    real_val = eval(f'{"self." if allow_access else ""}{v[1:]}')
-                                except:
-                                    real_val = eval(v[1:])
-                    else:
-                        real_val = None
+        if MObjectManager.is_family(value):
+            for member, definition in MObjectManager.family_members(name, value):
+                self.add_object(member, definition)
+        self._objects[name] = MObjectManager.Entry(name, value)
+        self.revision += 1
 
-                    properties = {} if 'properties' not in value else value['properties']
-                    val: Any
-                    updates = {}
+    def add_objects(self, items: Iterable[tuple[str, Any]]) -> None:
+        for name, value in items:
+            self.add_object(name, value)
 
-                    for k, v in properties.items():
-                        if isinstance(v, str) and v.startswith('%'):
-                            allow_access = len(v.split('.')) > 1
-                            try:
-                                updates[k] = eval(f'{"self." if allow_access else ""}{v[1:]}')
-                            except:
-                                updates[k] = eval(v[1:])
+    @staticmethod
+    def is_family(value: Any) -> bool:
+        return isinstance(value, dict) and isinstance(value.get('family'), dict)
 
-                        elif isinstance(v, str) and v.startswith('$'):
-                            updates[k] = self, v.lstrip('$')
+    @staticmethod
+    def family_names(name: str, value: dict[str, Any]) -> list[str]:
+        spec = value['family']
+        count = len(spec['data']) if 'data' in spec else spec.get('count')
+        if not isinstance(count, int) or count < 0:
+            raise MObjectManager.InvalidObjectException(
+                f'Family `{name}` needs a `count` or a `data` array'
+            )
+        start = spec.get('start', 1)
+        return [f'{name}_{start + i}' for i in range(count)]
+
+    @staticmethod
+    def family_members(name: str, value: dict[str, Any]) -> list[tuple[str, dict[str, Any]]]:
+        '''
+        Definitions of every member of a family, named like indexed objects (`name_1`, `name_2`, ...)
+
+        `{}` in the template value is replaced by the member index, or by its item of `data`
+        '''
+        spec = value['family']
+        if spec.get('layout', 'grid') not in MObjectManager.family_layouts:
+            raise MObjectManager.InvalidObjectException(
+                f'Family `{name}` has an unknown layout `{spec["layout"]}`'
+            )
+        names = MObjectManager.family_names(name, value)
+        if spec.get('layout') == 'coords' and len(spec.get('coords', [])) != len(names):
+            raise MObjectManager.InvalidObjectException(
+                f'Family `{name}` needs one coordinate per member'
+            )
 
-                    for k, v in updates.items():
-                        properties[k] = v
+        template = { k: v for k, v in value.items() if k != 'family' }
+        data = spec.get('data')
+        members = []
+        for row, member in enumerate(names):
+            definition = { 'family': [name, row], **template }
+            item = data[row] if data is not None else member.split('_')[-1]
+            if template.get('value') == '{}':
+                definition['value'] = item
+            elif isinstance(template.get('value'), str):
+                definition['value'] = template['value'].replace('{}', str(item))
+            members.append((member, definition))
+        return members
 
-                    allow_access = False
-                    if len(value['type'].split('.')) > 1:
-                        allow_access = True
+    @staticmethod
+    def layout(spec: dict[str, Any], count: int) -> dict[str, Any]:
+        '''
+        Positions (and optionally scales and colors) of all members of a family as arrays
+        '''
+        np = _numpy()
+        i = np.arange(count, dtype=np.float64)
+        layout = spec.get('layout', 'grid')
+        if layout == 'grid':
+            columns = spec.get('columns') or max(1, math.ceil(math.sqrt(count)))
+            rows = max(1, math.ceil(count / columns))
+            spacing = np.broadcast_to(np.asarray(spec.get('spacing', 1.0), dtype=np.float64), (2,))
+            positions = np.zeros((count, 3))
+            positions[:, 0] = (i % columns - (columns - 1) / 2) * spacing[0]
+            positions[:, 1] = ((rows - 1) / 2 - i // columns) * spacing[1]
+        elif layout == 'line':
+            direction = np.zeros(3)
+            given = np.asarray(spec.get('direction', [1, 0, 0]), dtype=np.float64)
+            direction[:len(given)] = given
+            direction /= np.linalg.norm(direction) or 1
+            positions = np.outer((i - (count - 1) / 2) * spec.get('spacing', 1.0), direction)
+        elif layout == 'circle':
+            angles = spec.get('angle', 0) + i * (2 * math.pi / max(count, 1))
+            positions = np.zeros((count, 3))
+            positions[:, 0] = np.cos(angles) * spec.get('radius', 2.0)
+            positions[:, 1] = np.sin(angles) * spec.get('radius', 2.0)
+        else:
+            # `[x, y]` and `[x, y, z]` may be mixed
+            positions = np.array([[*point, 0, 0][:3] for point in spec['coords']], dtype=np.float64).reshape(count, 3)
+
+        center = np.zeros(3)
+        given = np.asarray(spec.get('center', [0, 0, 0]), dtype=np.float64)
+        center[:len(given)] = given
+        result = { 'positions': positions + center }
+
+        # Two values (or colors) are interpolated across the family, `count` values are used as is
+        stops = np.linspace(0, 1, count)
+        if 'scales' in spec:
+            scales = np.asarray(spec['scales'], dtype=np.float64)
+            result['scales'] = scales if len(scales) == count else np.interp(stops, np.linspace(0, 1, len(scales)), scales)
+        if 'colors' in spec:
+            rgbs = np.array([_manim().color_to_rgb(color) for color in spec['colors']], dtype=np.float64)
+            if len(rgbs) == count:
+                result['colors'] = rgbs
+            else:
+                at = np.linspace(0, 1, len(rgbs))
+                result['colors'] = np.stack([np.interp(stops, at, rgbs[:, c]) for c in range(3)], axis=1)
+        return result
 
-                    sys.stderr.write(f'创建 Manim 对象：`{real_val}`, 参数: {properties}\n')
-                    if real_val is not None:
-                        val = eval(f'{"self." if allow_access else ""}{value["type"][0].upper() if not allow_access else value["type"][0]}{value["type"][1:]}')(real_val, **properties)
-                    else:
-                        val = eval(f'{"self." if allow_access else ""}{value["type"][0].upper() if not allow_access else value["type"][0]}{value["type"][1:]}')(**properties)
-
-                    if apply:
-                        if isinstance(val, Mobject):
-                            val.__manager__ = self
-                            val.find = val.__manager__.get_object
-                        setattr(self, attr, val)
-                except Exception as e:
+    def family_layout(self, name: str) -> dict[str, Any]:
+        layout = self._layouts.get(name)
+        if layout is None:
+            value = self.get_entry(name).definition
+            layout = self._layouts[name] = MObjectManager.layout(value['family'], len(MObjectManager.family_names(name, value)))
+        return layout
+
+    def set_object(self, name: str, value: Any) -> None:
+        entry = self.get_entry(name)
+        entry.mobject = value
+        entry.state = MObjectManager.Entry.BUILT
+
+    def _evaluate_member(self, expr: str) -> tuple[bool, Any]:
+        # `name.attr` where `name` is a registered object, looked up in the registry so that
+        # manager attributes (`layout`, `names`, ...) never shadow objects of the script
+        name, _, rest = expr.partition('.')
+        if not rest or name not in self._objects:
+            return False, None
+        return True, expression_engine.evaluate(f'__object__.{rest}', { '__object__': self.get_object(name) })
+
+    def evaluate(self, expr: str) -> Any:
+        # `%name.attr` expressions first try to access objects of this manager
+        try:
+            found, value = self._evaluate_member(expr)
+            if found:
+                return value
+        except Exception:
+            pass
+        return expression_engine.evaluate(expr, { 'self': self })
+
+    def resolve_type(self, type_name: str) -> Any:
+        if len(type_name.split('.')) > 1:
+            found, value = self._evaluate_member(type_name)
+            if not found:
+                raise MObjectManager.InvalidObjectException(
+                    f'Cannot find object "{type_name.split(".")[0]}" of type `{type_name}`'
+                )
+            return value
+        return expression_engine.evaluate(f'{type_name[0].upper()}{type_name[1:]}')
+
+    def dependencies_of(self, name: str) -> set[str]:
+        '''
+        Names of the objects which have to be built before `name`
+        '''
+        value = self.get_entry(name).definition
+        result = set()
+
+        def reference(v: Any) -> None:
+            if not isinstance(v, str):
+                return
+            if v.startswith('$'):
+                result.add(v[1:])
+            elif v.startswith('%') and len(v.split('.')) > 1 and v[1:].split('.')[0] in self._objects:
+                result.add(v[1:].split('.')[0])
+
+        if isinstance(value, list):
+            result.update(value)
+        elif MObjectManager.is_family(value):
+            result.update(MObjectManager.family_names(name, value))
+        elif isinstance(value, dict):
+            reference(value.get('value'))
+            for v in value.get('properties', {}).values():
+                reference(v)
+            if 'move_to' in value:
+                result.add(value['move_to'])
+            if len(value.get('type', '').split('.')) > 1:
+                result.add(value['type'].split('.')[0])
+
+        return result
+
+    def dependency_graph(self) -> dict[str, set[str]]:
+        graph = { name: self.dependencies_of(name) for name in self._objects }
+        for name, dependencies in graph.items():
+            for dependency in dependencies:
+                if dependency not in graph:
                     raise MObjectManager.InvalidObjectException(
-                        'Failed to create object'
-                    ) from e
+                        f'Object `{name}` depends on unknown object "{dependency}"'
+                    )
+        return graph
+
+    def build_order(self, graph: dict[str, set[str]] | None = None) -> list[str]:
+        '''
+        Topological order of `graph` (defaults to the whole registry), ties are broken by script order
+        '''
+        graph = self.dependency_graph() if graph is None else graph
+        position = { name: i for i, name in enumerate(self._objects) }
+        pending = { name: len(dependencies) for name, dependencies in graph.items() }
+        dependents: dict[str, list[str]] = { name: [] for name in graph }
+        for name, dependencies in graph.items():
+            for dependency in dependencies:
+                dependents[dependency].append(name)
+
+        ready = [(position[name], name) for name, count in pending.items() if not count]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(name)
+            for dependent in dependents[name]:
+                pending[dependent] -= 1
+                if not pending[dependent]:
+                    heapq.heappush(ready, (position[dependent], dependent))
+
+        if len(order) != len(graph):
+            cycle = sorted((name for name, count in pending.items() if count), key=position.get)
+            raise MObjectManager.InvalidObjectException(
+                f'Circular reference between objects: {", ".join(cycle)}'
+            )
+        return order
+
+    def independent_subgraphs(self, graph: dict[str, set[str]] | None = None) -> list[list[str]]:
+        '''
+        Splits the registry into groups of objects that do not reference each other,
+        every group is listed in build order
+        '''
+        graph = self.dependency_graph() if graph is None else graph
+        neighbours: dict[str, set[str]] = { name: set(dependencies) for name, dependencies in graph.items() }
+        for name, dependencies in graph.items():
+            for dependency in dependencies:
+                neighbours[dependency].add(name)
+
+        component: dict[str, int] = {}
+        count = 0
+        for root in graph:
+            if root in component:
+                continue
+            component[root] = root_index = count
+            count += 1
+            stack = [root]
+            while stack:
+                for other in neighbours[stack.pop()]:
+                    if other not in component:
+                        component[other] = root_index
+                        stack.append(other)
+
+        groups: list[list[str]] = [[] for _ in range(count)]
+        for name in self.build_order(graph):
+            groups[component[name]].append(name)
+        return groups
+
+    def validate(self) -> list[str]:
+        '''
+        Checks every definition without building anything, returns all problems found
+        '''
+        errors = []
+        for name, entry in self._objects.items():
+            value = entry.definition
+            if isinstance(value, list):
+                if not all(isinstance(item, str) for item in value):
+                    errors.append(f'{name}: Members of object group should be object names')
+            elif MObjectManager.is_family(value):
+                # Checked when added, its members are validated as plain objects
+                continue
+            elif isinstance(value, dict):
+                type_name = value.get('type', 'text')
+                if not isinstance(type_name, str) or not type_name:
+                    errors.append(f'{name}: Invalid object type `{type_name}`')
+                elif 'value' not in value and type_name not in MObjectManager.value_optional_types:
+                    errors.append(f'{name}: Object `{name}` should has an value')
+                if not isinstance(value.get('properties', {}), dict):
+                    errors.append(f'{name}: Properties should be an object')
+                for k in value:
+                    if k not in ('type', 'value', 'properties') and k not in MObjectManager.supported_attributes:
+                        errors.append(f'{name}: Unsupported attribute: {k}')
+            elif not isinstance(value, (str, int, float)):
+                errors.append(f'{name}: Unsupported definition `{value}`')
+
+        if not errors:
+            try:
+                self.build_order()
+            except MObjectManager.InvalidObjectException as e:
+                errors.append(str(e))
+        return errors
+
+    def build_object(self, name: str) -> Any:
+        entry = self.get_entry(name)
+        if entry.state == MObjectManager.Entry.BUILT:
+            return entry.mobject
+        if entry.state == MObjectManager.Entry.BUILDING:
+            raise MObjectManager.InvalidObjectException(
+                f'Circular reference while building object `{name}`'
+            )
 
-                for k, v in value.items():
-                    if k in ('type', 'value'):
-                        continue
-                    elif k not in MObjectManager.supported_attributes and k != 'properties':
-                        raise MObjectManager.InvalidObjectException(
-                            f'Unsupported attribute: {k}'
-                        )
-                    else:
-                        if apply:
-                            if k != 'properties':
-                                MObjectManager.supported_attributes[k](self, getattr(self, attr), v, attr)
-                        else:
-                            return val
+        entry.state = MObjectManager.Entry.BUILDING
+        value = entry.definition
+        type_name = value.get('type', 'text') if isinstance(value, dict) else 'text' if isinstance(value, str) else type(value).__name__
+        try:
+            with tracer.span(name, 'build', type=type_name):
+                self._build_entry(name, value)
+        finally:
+            if entry.state == MObjectManager.Entry.BUILDING:
+                entry.state = MObjectManager.Entry.DEFINED
+        return entry.mobject
+
+    def _build_entry(self, name: str, value: Any) -> None:
+        if isinstance(value, str):
+            self.set_object(name, self.construct('text', ManimName('Text'), value, {}))
+        elif MObjectManager.is_family(value):
+            self.set_object(name, _manim().VGroup(*self.get_objects(MObjectManager.family_names(name, value))))
+        elif isinstance(value, dict):
+            self._build_dict(name, value)
+        elif isinstance(value, list):
+            self.set_object(name, _manim().VGroup(*self.get_objects(value)))
+        else:
+            self.set_object(name, value)
+
+    def dependents_of(self, names: Iterable[str]) -> set[str]:
+        '''
+        Objects built (transitively) from any of `names`
+        '''
+        reverse: dict[str, set[str]] = {}
+        for name in self._objects:
+            for dependency in self.dependencies_of(name):
+                reverse.setdefault(dependency, set()).add(name)
+
+        result = set()
+        stack = list(names)
+        while stack:
+            for dependent in reverse.get(stack.pop(), ()):
+                if dependent not in result:
+                    result.add(dependent)
+                    stack.append(dependent)
+        return result
 
-            if isinstance(value, dict):
-                process_dict(value)
-            
+    _find_pattern = re.compile(r'this\.find\(\s*([\'"])([^\'"]+)\1\s*\)')
+
+    def compile_updater(self, name: str, expr: str, sources: list[str] | None = None) -> 'MObjectManager.Updater':
+        '''
+        Compiles an updater of object `name` once, `this.find("x")` calls with a literal name
+        become arguments resolved when the objects exist (at once, or on the first frame)
+
+        With `sources`, `expr` is an attribute expression of `sources[0]` which sets the value
+        of the updated object (see `SharedValue`)
+        '''
+        if sources is not None:
+            key = sources[0], expr
+            if key not in self._shared:
+                self._shared[key] = MObjectManager.SharedValue(expression_engine.evaluate(f'lambda __source__: __source__.{expr}'))
+            updater = MObjectManager.Updater(self, name, None, sources, self._shared[key])
+        else:
+            references: list[str] = []
+
+            def argument(match: re.Match) -> str:
+                if match.group(2) not in references:
+                    references.append(match.group(2))
+                return f'__ref{references.index(match.group(2))}__'
+
+            body = MObjectManager._find_pattern.sub(argument, expr)
+            arguments = ''.join(f', __ref{i}__' for i in range(len(references)))
+            updater = MObjectManager.Updater(self, name, expression_engine.evaluate(f'lambda this{arguments}: {body}'), references)
+
+        if all(reference in self._objects and self._objects[reference].state == MObjectManager.Entry.BUILT for reference in updater.references):
+            updater.resolve()
+        self._updaters.append(updater)
+        return updater
+
+    def updater_stats(self) -> dict[str, dict[str, float]]:
+        '''
+        Calls and seconds per updater, only counted while tracing (see `manim_trace`)
+        '''
+        result: dict[str, dict[str, float]] = {}
+        for updater in self._updaters:
+            item = result.setdefault(updater.name, { 'calls': 0, 'seconds': 0.0 })
+            item['calls'] += updater.calls
+            item['seconds'] += updater.seconds
+        return result
+
+    def updater_dependencies(self) -> dict[str, set[str]]:
+        '''
+        Objects with an updater, mapped to the objects their updaters read (`this.find("name")`)
+        '''
+        result: dict[str, set[str]] = {}
+        for name, entry in self._objects.items():
+            value = entry.definition
+            if not isinstance(value, dict):
+                continue
+            for k in ('associate', 'associate_value'):
+                if not isinstance(value.get(k), str):
+                    continue
+                references = result.setdefault(name, set())
+                if k == 'associate_value':
+                    references.add(value[k].split('.')[0])
+                for quote in ('"', "'"):
+                    for part in value[k].split(f'find({quote}')[1:]:
+                        references.add(part.split(quote)[0])
+        return result
+
+    def updater_references(self) -> set[str]:
+        '''
+        Objects with an updater and every object their updaters read
+        '''
+        result = set()
+        for name, references in self.updater_dependencies().items():
+            result.add(name)
+            result |= references
+        return result
+
+    def members_of(self, name: str) -> set[str]:
+        '''
+        `name` and the objects it contains (groups and families), which leave the scene with it
+        '''
+        result = set()
+        stack = [name]
+        while stack:
+            current = stack.pop()
+            if current in result:
+                continue
+            result.add(current)
+            value = self.get_entry(current).definition
             if isinstance(value, list):
-                setattr(self, attr, VGroup(*[self.get_object(item) for item in value]))                    
+                stack.extend(value)
+            elif MObjectManager.is_family(value):
+                stack.extend(MObjectManager.family_names(current, value))
+        return result
+
+    def release(self, name: str) -> Any:
+        '''
+        Detaches the updaters of `name` and forgets its mobject, returns the mobject (None
+        when it was never built), the object can no longer be requested afterwards
+        '''
+        entry = self.get_entry(name)
+        mobject = entry.mobject if entry.state == MObjectManager.Entry.BUILT else None
+        if mobject is not None and hasattr(mobject, 'clear_updaters'):
+            # Members are released on their own, they may outlive their group
+            mobject.clear_updaters(recursive=False)
+        self._updaters = [updater for updater in self._updaters if updater.name != name]
+        entry.mobject = None
+        entry.state = MObjectManager.Entry.RELEASED
+        return mobject
+
+    def reload(self, definitions: dict[str, Any]) -> set[str]:
+        '''
+        Replaces the definitions, objects whose definition (or any dependency) changed
+        go back to the defined state, returns their names
+        '''
+        expanded = {}
+        for name, value in definitions.items():
+            if MObjectManager.is_family(value):
+                expanded.update(MObjectManager.family_members(name, value))
+            expanded[name] = value
+        definitions = expanded
+        previous = self._objects
+        self._layouts = {}
+        changed = { name for name, entry in previous.items() if definitions.get(name, entry) != entry.definition }
+        changed |= set(definitions) - set(previous)
+        # Members are placed from their family layout, which may have changed under them
+        for name in list(changed):
+            if MObjectManager.is_family(definitions.get(name)):
+                changed.update(MObjectManager.family_names(name, definitions[name]))
+
+        self._objects = {
+            name: previous[name] if name in previous and name not in changed else MObjectManager.Entry(name, value)
+            for name, value in definitions.items()
+        }
+        invalidated = (changed | self.dependents_of(changed)) & set(self._objects)
+        # Updaters of rebuilt objects go away, the others find rebuilt references again
+        self._updaters = [updater for updater in self._updaters if updater.name not in invalidated]
+        for updater in self._updaters:
+            if invalidated.intersection(updater.references):
+                updater.objects = None
+        for name in invalidated:
+            entry = self._objects[name]
+            entry.mobject = None
+            entry.state = MObjectManager.Entry.DEFINED
+
+        self.revision += 1
+        self.build_order()
+        return invalidated
+
+    def fork(self) -> 'MObjectManager':
+        '''
+        An independent copy sharing no mobject with this manager, so one built manager
+        can serve several renders (objects keep their mutual references)
+        '''
+        return copy.deepcopy(self)
+
+    def closure(self, names: Iterable[str]) -> set[str]:
+        '''
+        `names` together with everything they (transitively) depend on
+        '''
+        result = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name in result:
+                continue
+            self.get_entry(name)
+            result.add(name)
+            stack.extend(self.dependencies_of(name))
+        return result
+
+    def materialize(self, names: Iterable[str]) -> list[str]:
+        '''
+        Builds `names` and their dependencies only, returns the names built in order
+        '''
+        required = self.closure(names)
+        order = self.build_order({ name: self.dependencies_of(name) for name in required })
+        for name in order:
+            self.build_object(name)
+        return order
+
+    def construct(self, type_name: str, constructor: Any, value: Any, properties: dict[str, Any]) -> Any:
+        cacheable = self.cache is not None and type_name in MObjectCache.cacheable_types and isinstance(value, str)
+        if cacheable:
+            key = MObjectCache.key(type_name, value, properties)
+            cached = self.cache.load(key)
+            if cached is not None:
+                return cached
+
+        val = constructor(value, **properties) if value is not None else constructor(**properties)
+        if cacheable:
+            self.cache.store(key, val)
+        return val
+
+    def _build_dict(self, name: str, value: dict[str, Any]) -> None:
+        type_name = value.get('type', 'text')
+        if 'value' not in value and type_name not in MObjectManager.value_optional_types:
+            raise MObjectManager.InvalidObjectException(
+                f'Object `{name}` should has an value'
+            )
+
+        try:
+            real_val: Any | None = None
+            if 'value' in value:
+                real_val = value['value']
+                if isinstance(real_val, str):
+                    if real_val.startswith('$'):
+                        real_val = self.get_object(real_val.lstrip('$'))
+                    elif real_val.startswith('%'):
+                        real_val = self.evaluate(real_val[1:])
+
+            properties = dict(value.get('properties', {}))
+            for k, v in properties.items():
+                if isinstance(v, str) and v.startswith('%'):
+                    properties[k] = self.evaluate(v[1:])
+                elif isinstance(v, str) and v.startswith('$'):
+                    properties[k] = self, v.lstrip('$')
+
+            constructor = self.resolve_type(type_name)
+
+            sys.stderr.write(f'创建 Manim 对象：`{real_val}`, 参数: {properties}\n')
+            val = self.construct(type_name, constructor, real_val, properties)
+
+            if isinstance(val, _manim().Mobject):
+                val.__manager__ = self
+                val.find = val.__manager__.get_object
+            self.set_object(name, val)
+        except Exception as e:
+            raise MObjectManager.InvalidObjectException(
+                'Failed to create object'
+            ) from e
+
+        for k, v in value.items():
+            if k in ('type', 'value', 'properties'):
+                continue
+            elif k not in MObjectManager.supported_attributes:
+                raise MObjectManager.InvalidObjectException(
+                    f'Unsupported attribute: {k}'
+                )
+            MObjectManager.supported_attributes[k](self, val, v, name)
+
+    def update_attributes(self, order: list[str] | None = None) -> None:
+        # `order` skips validating the dependency graph again (see `PlanCache`)
+        order = self.build_order() if order is None else order
+        if self.lazy:
+            return
+
+        for name in order:
+            self.build_object(name)
+
+        sys.stderr.write(f'表达式缓存：{expression_engine.stats()}\n')
+        if self.cache is not None:
+            sys.stderr.write(f'对象缓存：{self.cache.stats()}\n')
 
 
 MObjectManager.supported_attributes = { 
@@ -194,10 +1203,10 @@ class TextLoader:
     def load(self) -> dict[str, str]:
         raw_content: dict[str, str]
         try:
-            with open(self._src_file, 'r', encoding='utf-8') as f:
-                raw_content = json.loads(f.read())
+            with tracer.span('load script', 'load', file=self._src_file):
+                raw_content = dict(read_records(self._src_file))
 
-        except (OSError, json.JSONDecodeError) as e:
+        except (OSError, ValueError) as e:
             raise TextLoader.LoadException(
                 f'Error while deserializing json object: {e}'
             )
@@ -205,59 +1214,58 @@ class TextLoader:
             raise TextLoader.LoadException(fatal)
 
         return raw_content
+
+    def records(self) -> Iterable[tuple[str, Any]]:
+        '''
+        Object definitions one at a time, without holding the whole file (see `read_records`)
+        '''
+        try:
+            yield from read_records(self._src_file)
+        except (OSError, ValueError) as e:
+            raise TextLoader.LoadException(
+                f'Error while deserializing json object: {e}'
+            )
     
+    @staticmethod
+    def format_name(k: str) -> str:
+        index_num = ''
+        remains = ''
+        if len(index := k.split('.')) not in (1, 2):
+            raise TextLoader.LoadException(
+                f'Invalid syntax: `.` should only be used to mark index'
+            )
+        elif len(index) == 1:
+            remains = index[0]
+        elif len(index) == 2:
+            index_num, remains = index
+            try:
+                int(index_num)
+            except ValueError as e:
+                raise TextLoader.LoadException(
+                    f'Invalid index format: {e}'
+                )
+
+        remains = remains.replace('-', '_')
+        return remains if not index_num else f'{remains}_{index_num}'
+
     def apply_to(self, o: object, content: dict[str, Any]) -> None:
         if o is not None:
             for k, v in content.items():
-                index_num = ''
-                remains = ''
-                formatted_name = ''
-                if len(index := k.split('.')) not in (1, 2):
-                    raise TextLoader.LoadException(
-                        f'Invalid syntax: `.` should only be used to mark index'
-                    )
-                elif len(index) == 1:
-                    remains = index[0]
-                elif len(index) == 2:
-                    index_num, remains = index
-                    try:
-                        int(index_num)
-                    except ValueError as e:
-                        raise TextLoader.LoadException(
-                            f'Invalid index format: {e}'
-                        )
-
-                remains = remains.replace('-', '_')
-                formatted_name = remains if not index_num else f'{remains}_{index_num}'
-                setattr(o, formatted_name, v)
+                setattr(o, TextLoader.format_name(k), v)
 
+    def apply(self, content: dict[str, Any], lazy: bool = False, cache: MObjectCache | None = None) -> MObjectManager:
+        manager = MObjectManager(lazy, cache)
+        manager.add_objects((TextLoader.format_name(k), v) for k, v in content.items())
+        manager.update_attributes()
+        return manager
 
-    def apply(self, content: dict[str, Any]) -> MObjectManager:
-        manager = MObjectManager()
-
-        for k, v in content.items():
-            index_num = ''
-            remains = ''
-            formatted_name = ''
-            if len(index := k.split('.')) not in (1, 2):
-                raise TextLoader.LoadException(
-                    f'Invalid syntax: `.` should only be used to mark index'
-                )
-            elif len(index) == 1:
-                remains = index[0]
-            elif len(index) == 2:
-                index_num, remains = index
-                try:
-                    int(index_num)
-                except ValueError as e:
-                    raise TextLoader.LoadException(
-                        f'Invalid index format: {e}'
-                    )
-
-            remains = remains.replace('-', '_')
-            formatted_name = remains if not index_num else f'{remains}_{index_num}'
-            manager.add_object(formatted_name, v)
-
+    def stream(self, lazy: bool = False, cache: MObjectCache | None = None) -> MObjectManager:
+        '''
+        Same as `apply(load())` but registers the definitions while reading the file
+        '''
+        manager = MObjectManager(lazy, cache)
+        with tracer.span('load script', 'load', file=self._src_file):
+            manager.add_objects((TextLoader.format_name(k), v) for k, v in self.records())
         manager.update_attributes()
         return manager
 
@@ -266,7 +1274,7 @@ class Director:
 
     # execution write support 0 positional argument and 0 property
     basic_property = { 'duration': 'run_time' }
-    animation_controller_mapping = [AnimationGroup, None, LaggedStart]
+    animation_controller_mapping = [ManimName('AnimationGroup'), None, ManimName('LaggedStart')]
     # Controller 'Succession' deprecated
 
     @dataclass
@@ -277,61 +1285,73 @@ class Director:
         invoke_params: list[Any]
         related: Mobject | None = None
 
+    @dataclass
+    class AnimationNode:
+        '''
+        A validated action with its target resolved, controllers keep their animations in `children`
+        '''
+        action: str
+        target: str | None = None
+        params: list[Any] = field(default_factory=list)
+        properties: dict[str, Any] = field(default_factory=dict)
+        cfg: dict[str, Any] = field(default_factory=dict)
+        children: list['Director.AnimationNode'] = field(default_factory=list)
+        is_async: bool = False
+
+    @dataclass
+    class PlayStep:
+        '''
+        A single `play`, `wait` or `add` call on the scene
+        '''
+        section: str
+        location: str
+        kind: str
+        node: 'Director.AnimationNode'
+
+    @dataclass
+    class ActionPlan:
+        sections: list[str]
+        steps: list['Director.PlayStep']
+
+        def section_steps(self, section: str) -> list['Director.PlayStep']:
+            return [step for step in self.steps if step.section == section]
+
+        @property
+        def animation_count(self) -> int:
+            # Number of animations manim will count (`add` is not an animation)
+            return sum(1 for step in self.steps if step.kind != 'add')
+
+    # Animations taking their target out of the scene
+    vanishing_actions = ('fadeout', 'uncreate', 'unwrite', 'transform')
+
+    # Animations of a single target which `optimize` may play together with others
+    mergeable_actions = ('write', 'unwrite', 'create', 'uncreate', 'fadeout', 'translate', 'scale', 'shift', 'rotate', 'transform', 'trace')
+    # A strict merge begins every animation of the run at once, so only animations leaving
+    # their target untouched at alpha 0 may wait for their turn, `write` and `create`
+    # only while the target has not been shown yet
+    strict_actions = ('unwrite', 'uncreate', 'fadeout', 'translate', 'scale', 'shift', 'rotate')
+    introducing_actions = ('write', 'create')
+
     executions = {
-         'write': (Write, 0, {}),
-         'unwrite': (Unwrite, 0, {}),
-         'create': (Create, 0, {}),
-         'uncreate': (Uncreate, 0, {}),
-         'transform': (ReplacementTransform, 1, {}),
-         'fadeout': (FadeOut, 0, {}),
+         'write': (ManimName('Write'), 0, {}),
+         'unwrite': (ManimName('Unwrite'), 0, {}),
+         'create': (ManimName('Create'), 0, {}),
+         'uncreate': (ManimName('Uncreate'), 0, {}),
+         'transform': (ManimName('ReplacementTransform'), 1, {}),
+         'fadeout': (ManimName('FadeOut'), 0, {}),
          'translate': ('shift', 1, {}),
          'scale': ('scale', 1, {}),
          'shift': ('shift', 1, {}),
+         'rotate': ('rotate', 1, {}),
          'parallel': (0, 1, {}),
          # 'succession': (1, -1, {}),
          'lagged': (2, -1, { 'ratio': 'lag_ratio' }),
          'wait': (-1, 1, {}),
          'select': (-2, -1, { 'action': 'action' }),
          'add': (-3, -1, {}),
-         'trace': (MoveAlongPath, 1, {})
+         'trace': (ManimName('MoveAlongPath'), 1, {})
     }
 
-    @staticmethod
-    def _execute_simple(d: 'Director', a: Any, t: str, args: list[Any], kwargs: dict[str, Any], cfg: dict[str, Any]) -> None:
-        evaluated = []
-        for arg in args:
-            if isinstance(arg, str) and arg.startswith('$'):
-                evaluated.append(d.om.get_object(arg[1:]))
-            else:
-                evaluated.append(arg)
-        
-        d.target.play(
-            a(d.om.get_object(t), *evaluated, **kwargs),
-            **cfg
-        )
-
-    @staticmethod
-    def _execute_shift(d: 'Director', t: str, args: list[Any], _: dict[str, Any], cfg: dict[str, Any]) -> None:
-        assert len(args) == 1, 'Invalid parameters for action `shift`'
-        d.target.play(
-            getattr(d.om.get_object(t).animate, 'shift')(eval(args[0])),
-            **cfg
-        )
-
-    @staticmethod
-    def _execute_scale(d: 'Director', t: str, args: list[Any], _: dict[str, Any], cfg: dict[str, Any]) -> None:
-        assert len(args) == 1, 'Invalid parameters for action `scale`'
-        if isinstance(args[0], str):
-            d.target.play(
-                getattr(d.om.get_object(t).animate, 'scale')(eval(args[0])),
-                **cfg
-            )
-        else:
-            d.target.play(
-                getattr(d.om.get_object(t).animate, 'scale')(args[0]),
-                **cfg
-            )
-
     @staticmethod
     def _pack_simple(d: 'Director', a: Any, t: str, args: list[Any], kwargs: dict[str, Any], cfg: dict[str, Any]) -> AnimationWithPlayArguments:
         evaluated = []
@@ -348,7 +1368,7 @@ class Director:
     @staticmethod
     def _pack_shift(d: 'Director', t: str, args: list[Any], kwargs: dict[str, Any], cfg: dict[str, Any]) -> AnimationWithPlayArguments:
         assert len(args) == 1, 'Invalid parameters for action `shift`'
-        a = eval(args[0])
+        a = expression_engine.evaluate(args[0])
         ob = d.om.get_object(t)
         return Director.AnimationWithPlayArguments(
            ob.animate.shift(a), cfg, 'shift', [a], ob
@@ -359,7 +1379,7 @@ class Director:
         assert len(args) == 1, 'Invalid parameters for action `scale`'
         ob = d.om.get_object(t)
         if isinstance(args[0], str):
-            a = eval(args[0])
+            a = expression_engine.evaluate(args[0])
             return Director.AnimationWithPlayArguments(
                 ob.animate.scale(a),
                 cfg, 'scale', [a], ob
@@ -369,305 +1389,779 @@ class Director:
                 ob.animate.scale(args[0]),
                 cfg, 'scale', [args[0]], ob
             )
+
+    @staticmethod
+    def _pack_rotate(d: 'Director', t: str, args: list[Any], kwargs: dict[str, Any], cfg: dict[str, Any]) -> AnimationWithPlayArguments:
+        assert len(args) == 1, 'Invalid parameters for action `rotate`'
+        ob = d.om.get_object(t)
+        a = expression_engine.evaluate(args[0]) if isinstance(args[0], str) else args[0]
+        return Director.AnimationWithPlayArguments(
+            ob.animate.rotate(a), cfg, 'rotate', [a], ob
+        )
+
+    @staticmethod
+    def _fuse_transforms(operations: list[tuple[str, list[Any]]]) -> Any:
+        '''
+        A function applying consecutive `shift`, `scale` and `rotate` calls to a mobject as
+        one affine map, pivots follow manim: the bounding box center of the whole family
+        at the time of each call
+        '''
+        def apply(m: Mobject) -> Mobject:
+            np = _numpy()
+            points = m.get_all_points()
+            if not len(points):
+                return m
+
+            linear, translation = np.eye(3), np.zeros(3)
+            center = None
+            for method, params in operations:
+                if method == 'shift':
+                    translation = translation + np.asarray(params[0], dtype=np.float64)
+                    if center is not None:
+                        center = center + np.asarray(params[0], dtype=np.float64)
+                    continue
+                if center is None:
+                    moved = points @ linear.T + translation
+                    center = (moved.min(axis=0) + moved.max(axis=0)) / 2
+                if method == 'scale':
+                    step = np.diag(np.broadcast_to(np.asarray(params[0], dtype=np.float64), (3,)))
+                else:
+                    cos, sin = math.cos(params[0]), math.sin(params[0])
+                    step = np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]])
+                linear = step @ linear
+                translation = step @ (translation - center) + center
+                # Scaling keeps the bounding box center, rotating does not
+                if method == 'rotate':
+                    center = None
+
+            m.apply_points_function_about_point(lambda p: p @ linear.T + translation, about_point=np.zeros(3))
+            return m
+        return apply
         
     class ExecutionException(Exception):
         pass
+
+    class PlanException(ExecutionException):
+
+        def __init__(self, errors: list[str]) -> None:
+            super().__init__('\n'.join(errors))
+            self.errors = errors
+
+        def __reduce__(self) -> tuple[Any, ...]:
+            return self.__class__, (self.errors,)
     
     def __init__(self, om: MObjectManager, action_script: str) -> None:
         self.om = om
         self._action_script_src = action_script
         self.target = None
         self.actions = []
+        self.plan: Director.ActionPlan | None = None
+        # step index -> objects released after it (see `analyze_liveness`), None keeps every object
+        self.releases: dict[int, list[str]] | None = None
+        # section name -> (procedure json, manager revision, compiled steps)
+        self._compiled: dict[str, tuple[str, int, list[Director.PlayStep]]] = {}
 
     def set_target_show(self, show: Scene) -> None:
         self.target = show
 
     def load_actions(self) -> None:
-        try:
-            actions: dict[str, Any]
-            with open(self._action_script_src, 'r', encoding='utf-8') as f:
-                actions = json.loads(f.read())
-
-            for k, v in actions.items():
+        with tracer.span('load actions', 'load', file=self._action_script_src):
+            for k, v in self.sections():
                 self.actions.append({
                     'scene': k,
                     'procedure': v
                 })
+        self.plan = None
+
+    def sections(self) -> Iterable[tuple[str, list[Any]]]:
+        '''
+        `(section, procedure)` pairs read one at a time from the actions file (see `read_records`)
+        '''
+        try:
+            yield from read_records(self._action_script_src)
         except Exception as e:
             raise Director.ExecutionException('Failed to load actions from file') from e
 
-    def generate_action_sequence(self, seq: list[Any]) -> list[AnimationWithPlayArguments]:
-        result = []
+    def collect_targets(self, procedures: Iterable[list[Any]] | None = None) -> set[str]:
+        '''
+        Names of all objects the loaded actions (or `procedures`) refer to, including `select` expansions
+        '''
+        result = set()
+
+        def walk(seq: list[Any]) -> None:
+            for action in seq:
+                if not isinstance(action, dict):
+                    continue
+                target = action.get('target')
+                params = action.get('params', [])
+                if action.get('action') == 'select':
+                    if not isinstance(params, list):
+                        params = expression_engine.evaluate(params)
+                    for param in params:
+                        walk([{ **action.get('properties', {}), 'target': target.format(param) }])
+                    continue
+
+                if isinstance(target, str):
+                    result.add(target)
+                if isinstance(params, list):
+                    for param in params:
+                        if isinstance(param, str) and param.startswith('$'):
+                            result.add(param[1:])
+                        elif isinstance(param, dict):
+                            walk([param])
+
+        if procedures is None:
+            procedures = [scene['procedure'] for scene in self.actions]
+        for procedure in procedures:
+            walk(procedure)
+        return result
 
-        for action in seq:
-            if 'action' not in action:
-                raise Director.ExecutionException('An action must be specified')
-            action_name = action['action']
-            if action_name not in Director.executions:
+    def materialize(self) -> list[str]:
+        '''
+        Builds only the objects reachable from the loaded actions (and their dependencies)
+        '''
+        return self.om.materialize(self.collect_targets())
+
+    def _check_object(self, name: Any) -> None:
+        if not isinstance(name, str) or name not in self.om:
+            raise Director.ExecutionException(f'Cannot find object "{name}"')
+
+    @staticmethod
+    def _config_of(action: dict[str, Any], allowed: tuple[str, ...]) -> dict[str, Any]:
+        cfg = {}
+        for k, v in action.items():
+            if k in allowed:
+                continue
+            elif k in Director.basic_property:
+                cfg[Director.basic_property[k]] = v
+            else:
                 raise Director.ExecutionException(
-                    f'Action `{action_name}` is unsupported'
+                    f'Config `{k}` is invalid'
                 )
-            
-            action_object, action_cargs, action_kwargs = Director.executions[action_name]
-            cfg = {}
-                    
-            if isinstance(action_object, int):
-                if 'params' not in action:
-                    raise Director.ExecutionException('Missing parameters')
-
-                if action_object == -1:
-                    if len(action['params']) != 1 or len(action.keys()) != 2:
-                        raise Director.ExecutionException('Invalid parameters for action `wait`')
-                    result.append(Director.AnimationWithPlayArguments(Wait(action['params'][0]), {}, None, []))
-                elif action_object == -2:
-                    if 'target' not in action:
-                        raise Director.ExecutionException('Missing general target for selection')
-                    elif 'params' not in action:
-                        raise Director.ExecutionException('Missing replacement parameters for selection')
-                    elif 'properties' not in action:
-                        raise Director.ExecutionException('Missing actions for selection')
-                    else:
-                        if not isinstance(action['params'], list):
-                                action['params'] = eval(action['params'])
-
-                        for param in action['params']:
-                            action_details = action['properties']
-                            action_details['target'] = action['target'].format(param)
-                            for sub_actions in self.generate_action_sequence([action_details]):
-                                result.append(sub_actions)
-                elif action_object == -3:
+        return cfg
+
+    def _expand_selection(self, action: dict[str, Any]) -> list[dict[str, Any]]:
+        if 'target' not in action:
+            raise Director.ExecutionException('Missing general target for selection')
+        elif 'params' not in action:
+            raise Director.ExecutionException('Missing replacement parameters for selection')
+        elif 'properties' not in action:
+            raise Director.ExecutionException('Missing actions for selection')
+
+        params = action['params']
+        if not isinstance(params, list):
+            params = expression_engine.evaluate(params)
+        return [{ **action['properties'], 'target': action['target'].format(param) } for param in params]
+
+    @staticmethod
+    def _batch_selection(action: dict[str, Any], nodes: list[AnimationNode]) -> list[AnimationNode]:
+        # `"batch": true` plays every expansion in one call, `"batch": n` in groups of n,
+        # `"lag"` staggers the animations of a group like `lagged`
+        batch = action.get('batch', False)
+        if batch is False:
+            # Settings of the selection itself (`lag`, `duration`) only apply to batches
+            extra = sorted(action.keys() - { 'action', 'target', 'params', 'properties', 'batch' })
+            if extra:
+                Director._config_of(
+                    { k: v for k, v in action.items() if k not in ('lag', 'batch') }, ('action', 'target', 'params', 'properties')
+                )
+                raise Director.ExecutionException(f'Config `{"`, `".join(extra)}` of a selection needs `batch`')
+            return nodes
+        if not nodes:
+            return nodes
+        size = len(nodes) if batch is True else batch
+        if not isinstance(size, int) or size < 1:
+            raise Director.ExecutionException(f'Invalid batch size `{batch}` for selection')
+        if any(node.action == 'add' for node in nodes):
+            raise Director.ExecutionException('Action `add` cannot be batched')
+
+        cfg = Director._config_of(action, ('action', 'target', 'params', 'properties', 'batch', 'lag'))
+        result = []
+        for i in range(0, len(nodes), size):
+            group = nodes[i:i + size]
+            if 'lag' in action:
+                result.append(Director.AnimationNode('lagged', properties={ 'ratio': action['lag'] }, cfg=dict(cfg), children=group))
+            else:
+                result.append(Director.AnimationNode('parallel', cfg=dict(cfg), children=group))
+        return result
+
+    def compile_action(self, action: Any, top_level: bool = False) -> list[AnimationNode]:
+        '''
+        Validates a single action and resolves it into animation nodes,
+        `select` expands into one node per parameter
+        '''
+        if not isinstance(action, dict) or 'action' not in action:
+            raise Director.ExecutionException('An action must be specified')
+        action_name = action['action']
+        if action_name not in Director.executions:
+            raise Director.ExecutionException(
+                f'Action `{action_name}` is unsupported'
+            )
+
+        action_object, action_cargs, action_kwargs = Director.executions[action_name]
+        properties = action.get('properties', {})
+
+        if isinstance(action_object, int):
+            if 'params' not in action and action_object != -3:
+                raise Director.ExecutionException('Missing parameters')
+
+            if action_object == -1:
+                if len(action['params']) != 1 or len(action.keys()) != 2:
+                    raise Director.ExecutionException('Invalid parameters for action `wait`')
+                return [Director.AnimationNode(action_name, params=list(action['params']))]
+
+            elif action_object == -2:
+                result = []
+                for details in self._expand_selection(action):
+                    result.extend(self.compile_action(details, top_level))
+                return Director._batch_selection(action, result)
+
+            elif action_object == -3:
+                if not top_level:
                     raise Director.ExecutionException(
                         "Action `add` should not be placed inside an animation controller"
                     )
-                else:
-                    for k, v in action.items():
-                        if k in ('action', 'target', 'params', 'async', 'properties'):
-                            continue
-                        elif k in Director.basic_property.keys():
-                            cfg[Director.basic_property[k]] = v
-                        else:
-                            raise Director.ExecutionException(
-                                f'Config `{k}` is invalid'
-                            )
-
-                    # if 'target' in action:
-                    #     raise Director.ExecutionException('Animation controller use params as target')
-                    if 'params' not in action:
-                        raise Director.ExecutionException('Animation controller needs an animated sequence as paramater')
-                    animation_controller = Director.animation_controller_mapping[action_object]
-
-                    controller_params = {} if 'properties' not in action else {
-                        action_kwargs[k]: v for k, v in action['properties'].items()
-                    }
-                    result.append(Director.AnimationWithPlayArguments(animation_controller(
-                        *[a.animation for a in self.generate_action_sequence(action['params'])],
-                        **controller_params
-                    ), cfg, None, []))
-
-            elif isinstance(action_object, str):
-                for k, v in action.items():
-                    if k in ('action', 'target', 'params', 'properties'):
-                        continue
-                    if k in Director.basic_property:
-                        cfg[Director.basic_property[k]] = v
-                    else:
-                        raise Director.ExecutionException(
-                            f'Config `{k}` is invalid'
-                        )
-
-                if 'params' not in action:
-                    raise Director.ExecutionException('Missing parameters')
                 if 'target' not in action:
-                        raise Director.ExecutionException('An action target must be specified')
-                
-                result.append(getattr(self.__class__, f'_pack_{action_object}')(
-                    self, 
-                    action['target'],
-                    action['params'],
-                    {} if 'properties' not in action else action['properties'],
-                    cfg
-                ))
+                    raise Director.ExecutionException('Missing target to add')
+                self._check_object(action['target'])
+                return [Director.AnimationNode(action_name, target=action['target'])]
+
+            cfg = Director._config_of(action, ('action', 'target', 'params', 'async', 'properties'))
+            if top_level and 'target' in action:
+                raise Director.ExecutionException('Animation controller use parameters as target')
+            if not isinstance(action['params'], list):
+                raise Director.ExecutionException('Animation controller needs an animated sequence as paramater')
+            for k in properties:
+                if k not in action_kwargs:
+                    raise Director.ExecutionException(
+                        f'Property `{k}` is invalid for `{action_name}`'
+                    )
+
+            children, errors = [], []
+            for i, sub_action in enumerate(action['params']):
+                try:
+                    for child in self.compile_action(sub_action):
+                        # Nested `parallel` without its own settings plays the same as its children
+                        if child.action == action_name == 'parallel' and not (child.cfg or child.properties or child.is_async):
+                            children.extend(child.children)
+                        else:
+                            children.append(child)
+                except Director.PlanException as e:
+                    errors.extend(f'{action_name}[{i}].{error}' for error in e.errors)
+                except Director.ExecutionException as e:
+                    errors.append(f'{action_name}[{i}]: {e}')
+            if errors:
+                raise Director.PlanException(errors)
+            if action.get('async', False) and any(not isinstance(Director.executions[child.action][0], str) for child in children):
+                raise Director.ExecutionException('Only shift, scale and rotate can be played asynchronously')
+
+            return [Director.AnimationNode(
+                action_name, properties=dict(properties), cfg=cfg, children=children,
+                is_async=bool(action.get('async', False))
+            )]
+
+        cfg = Director._config_of(action, ('action', 'target', 'params', 'properties'))
+        if 'target' not in action:
+            raise Director.ExecutionException('An action target must be specified')
+        self._check_object(action['target'])
+        params = list(action.get('params', []))
+
+        if isinstance(action_object, str):
+            if 'params' not in action:
+                raise Director.ExecutionException('Missing parameters')
+            if len(params) != 1:
+                raise Director.ExecutionException(f'Invalid parameters for action `{action_name}`')
+            if isinstance(params[0], str):
+                try:
+                    expression_engine.compile(params[0])
+                except ExpressionEngine.ExpressionException as e:
+                    raise Director.ExecutionException(str(e)) from e
+        else:
+            if action_cargs:
+                if 'params' not in action or (len(params) != action_cargs and action_cargs != -1) or (len(params) < 1 and action_cargs == -1):
+                    warnings.warn(f'Unsufficient positional arguments for action `{action_name}`')
+
+            if 'properties' not in action and len(action_kwargs):
+                warnings.warn(f'Missing properties for `{action_name}`')
+            elif len(action_kwargs):
+                for a in action_kwargs:
+                    if a not in properties.keys():
+                        warnings.warn(f'Missing property \'{a}\' for `{action_name}`')
+
+            for param in params:
+                if isinstance(param, str) and param.startswith('$'):
+                    self._check_object(param[1:])
+
+        return [Director.AnimationNode(
+            action_name, target=action['target'], params=params, properties=dict(properties), cfg=cfg
+        )]
+
+    def compile(self) -> ActionPlan:
+        '''
+        Turns the loaded actions into a plan of play steps, every error in the
+        actions is collected and reported at once
+        '''
+        steps, errors = [], []
+        with tracer.span('compile plan', 'plan', sections=len(self.actions)):
+            for scene in self.actions:
+                section_steps, section_errors = self.compile_section(scene['scene'], scene['procedure'])
+                steps.extend(section_steps)
+                errors.extend(section_errors)
+
+        if errors:
+            raise Director.PlanException(errors)
+        self.plan = Director.ActionPlan([scene['scene'] for scene in self.actions], steps)
+        return self.plan
+
+    def compile_section(self, section: str, procedure: list[Any], remember: bool = True) -> tuple[list[PlayStep], list[str]]:
+        # Unchanged sections reuse their steps as long as the object definitions did not change
+        key = json.dumps(procedure, sort_keys=True, default=repr) if remember else None
+        cached = self._compiled.get(section)
+        if cached is not None and cached[0] == key and cached[1] == self.om.revision:
+            return cached[2], []
+
+        steps, errors = [], []
+        for i, action in enumerate(procedure):
+            location = f'{section}[{i}]'
+            try:
+                for node in self.compile_action(action, top_level=True):
+                    kind = node.action if node.action in ('wait', 'add') else 'play'
+                    steps.append(Director.PlayStep(section, location, kind, node))
+            except Director.PlanException as e:
+                errors.extend(f'{location}.{error}' for error in e.errors)
+            except (Director.ExecutionException, ExpressionEngine.ExpressionException) as e:
+                errors.append(f'{location}: {e}')
+            except Exception as e:
+                errors.append(f'{location}: {type(e).__name__}: {e}')
+
+        if not errors and remember:
+            self._compiled[section] = key, self.om.revision, steps
+        return steps, errors
+
+    def reload_actions(self) -> list[str]:
+        '''
+        Reads the actions file again and recompiles the plan, returns the sections that changed
+        '''
+        previous = { scene['scene']: scene['procedure'] for scene in self.actions }
+        self.actions = []
+        self.load_actions()
+        self.compile()
+        return [scene['scene'] for scene in self.actions if previous.get(scene['scene']) != scene['procedure']]
+
+    def fork(self, om: MObjectManager) -> 'Director':
+        '''
+        A director playing the same plan on another manager (see `MObjectManager.fork`)
+        '''
+        director = Director(om, self._action_script_src)
+        director.actions = self.actions
+        director.plan = self.plan
+        director.releases = self.releases
+        return director
+
+    def dry_run(self, optimize: str | None = None) -> dict[str, Any]:
+        '''
+        Validates and times the plan without producing any frame, `optimize` as in `optimize`
+        '''
+        st = time.perf_counter()
+        plan = self.compile()
+        if optimize:
+            self.optimize(strict=optimize == 'strict')
+            plan = self.plan
+        elapsed = time.perf_counter() - st
+
+        sections = {}
+        for section in plan.sections:
+            steps = plan.section_steps(section)
+            sections[section] = {
+                'steps': len(steps),
+                'duration': sum(Director.estimate_duration(step.node) for step in steps)
+            }
+        return {
+            'compile_ms': round(elapsed * 1000, 3),
+            'steps': len(plan.steps),
+            'animations': plan.animation_count,
+            'duration': sum(section['duration'] for section in sections.values()),
+            'sections': sections
+        }
+
+    def _step_references(self, step: PlayStep) -> set[str]:
+        # Objects a step uses, with everything they contain or are built from
+        names = set()
+        for node in Director._leaves(step.node):
+            names.add(node.target)
+            names.update(p[1:] for p in node.params if isinstance(p, str) and p.startswith('$'))
+        return self.om.closure(name for name in names if name in self.om)
+
+    def _merge_references(self, step: PlayStep, updated: set[str], strict: bool, frame_rate: float | None, shown: set[str]) -> set[str] | None:
+        # Objects a step animates (with everything they contain), None when it has to stay on its own
+        node = step.node
+        if step.kind != 'play' or node.children or node.is_async or node.action not in Director.mergeable_actions:
+            return None
+        references = self._step_references(step)
+        if strict:
+            if node.action not in Director.strict_actions and not (node.action in Director.introducing_actions and not references & shown):
+                return None
+            run_time = float(node.cfg.get('run_time', 1))
+            if frame_rate is not None and abs(run_time * frame_rate - round(run_time * frame_rate)) > 1e-9:
+                return None
+        return None if references & updated else references
+
+    def optimize(self, strict: bool = False, frame_rate: float | None = None) -> dict[str, int]:
+        '''
+        Merges runs of adjacent single object animations with the same settings and no
+        shared (or updater related) objects into one play call, returns the play count
+        before and after
+
+        By default a run plays at once as an `AnimationGroup`, which shortens the video.
+        `strict` keeps the timeline: the run plays one after another inside a single
+        `LaggedStart(lag_ratio=1)`, only `strict_actions` (and `introducing_actions` of
+        objects not shown yet) lasting whole frames are merged so every frame stays the
+        same, without manim (`--dry-run`) durations are not checked against the frame rate
+        '''
+        plan = self.plan if self.plan is not None else self.compile()
+        if strict and frame_rate is None:
+            try:
+                frame_rate = _manim().config.frame_rate
+            except ImportError:
+                pass
+        updated = self.om.updater_references()
+        steps: list[Director.PlayStep] = []
+        run: list[Director.PlayStep] = []
+        used: set[str] = set()
+        # Objects used by earlier steps, which may be on screen
+        shown: set[str] = set()
+
+        def flush() -> None:
+            if len(run) > 1:
+                children = [step.node for step in run]
+                cfg = dict(children[0].cfg)
+                if strict:
+                    if 'run_time' in cfg:
+                        cfg['run_time'] = cfg['run_time'] * len(children)
+                    node = Director.AnimationNode('lagged', properties={ 'ratio': 1 }, cfg=cfg, children=children)
+                else:
+                    node = Director.AnimationNode('parallel', cfg=cfg, children=children)
+                steps.append(Director.PlayStep(run[0].section, f'{run[0].location}~{run[-1].location}', 'play', node))
             else:
-                for k, v in action.items():
-                    if k in ('action', 'target', 'params', 'properties'):
+                steps.extend(run)
+            run.clear()
+            used.clear()
+
+        for step in plan.steps:
+            references = self._merge_references(step, updated, strict, frame_rate, shown)
+            if references is None:
+                flush()
+                steps.append(step)
+            else:
+                if run and (run[0].section != step.section or run[0].node.cfg != step.node.cfg or references & used):
+                    flush()
+                run.append(step)
+                used |= references
+            shown |= self._step_references(step)
+        flush()
+
+        self.plan = Director.ActionPlan(plan.sections, steps)
+        report = { 'before': plan.animation_count, 'after': self.plan.animation_count }
+        sys.stderr.write(f'时间线优化：{report["before"]} 段动画合并为 {report["after"]} 段\n')
+        return report
+
+    @staticmethod
+    def _leaves(node: AnimationNode) -> Iterable[AnimationNode]:
+        # Single target nodes of a step in play order
+        if node.children:
+            for child in node.children:
+                yield from Director._leaves(child)
+        else:
+            yield node
+
+    def liveness(self, plan: ActionPlan | None = None) -> dict[int, list[str]]:
+        '''
+        Objects that can be released after each step of the plan: objects whose last use
+        takes them out of the scene (`vanishing_actions`), kept as long as an updater of
+        a living object reads them, objects still shown at the end are never released
+        '''
+        plan = plan or self.plan or self.compile()
+        deaths: dict[str, int] = {}
+        for i, step in enumerate(plan.steps):
+            touched: dict[str, bool] = {}
+            for node in Director._leaves(step.node):
+                names = { node.target } | { p[1:] for p in node.params if isinstance(p, str) and p.startswith('$') }
+                for name in self.om.closure(name for name in names if name in self.om):
+                    touched[name] = False
+                if node.action in Director.vanishing_actions and node.target in self.om:
+                    for name in self.om.members_of(node.target):
+                        touched[name] = True
+            for name, gone in touched.items():
+                if gone:
+                    deaths[name] = i
+                else:
+                    deaths.pop(name, None)
+
+        # Whatever an updater reads lives as long as the updated object
+        readers = self.om.updater_dependencies()
+        changed = True
+        while changed:
+            changed = False
+            for name, references in readers.items():
+                end = deaths.get(name)
+                for reference in references:
+                    if reference not in deaths or (end is not None and deaths[reference] >= end):
                         continue
-                    if k in Director.basic_property:
-                        cfg[Director.basic_property[k]] = v
+                    if end is None:
+                        del deaths[reference]
                     else:
+                        deaths[reference] = end
+                    changed = True
+
+        releases: dict[int, list[str]] = {}
+        for name, i in deaths.items():
+            releases.setdefault(i, []).append(name)
+        return { i: sorted(names) for i, names in releases.items() }
+
+    def analyze_liveness(self) -> dict[int, list[str]]:
+        '''
+        Plays from now on release dead objects after their last use (see `liveness`)
+        and report the memory used after every section, run it after `optimize`
+        '''
+        with tracer.span('liveness', 'plan'):
+            self.releases = self.liveness()
+        sys.stderr.write(f'存活分析：{sum(len(names) for names in self.releases.values())} 个对象将在最后一次使用后释放\n')
+        return self.releases
+
+    def release(self, name: str) -> None:
+        mobject = self.om.release(name)
+        if mobject is not None:
+            self.target.remove(mobject)
+
+    @staticmethod
+    def memory_usage() -> int:
+        # Resident set size in bytes, the peak one where /proc is unavailable
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+    @staticmethod
+    def estimate_duration(node: AnimationNode) -> float:
+        # Scene time of a node assuming manim defaults (1 second per animation)
+        if node.action == 'add':
+            return 0.0
+        if node.action == 'wait':
+            return float(node.params[0])
+        if 'run_time' in node.cfg:
+            return float(node.cfg['run_time'])
+        if node.children:
+            durations = [Director.estimate_duration(child) for child in node.children]
+            if node.action == 'lagged':
+                ratio = node.properties.get('ratio', 0.05)
+                return max(i * ratio * d + d for i, d in enumerate(durations)) if durations else 0.0
+            return max(durations, default=0.0)
+        return 1.0
+
+    def build_animation(self, node: AnimationNode) -> AnimationWithPlayArguments:
+        action_object, _, action_kwargs = Director.executions[node.action]
+
+        if node.action == 'wait':
+            return Director.AnimationWithPlayArguments(_manim().Wait(node.params[0]), {}, None, [])
+        elif isinstance(action_object, int):
+            animation_controller = Director.animation_controller_mapping[action_object]
+            controller_params = { action_kwargs[k]: v for k, v in node.properties.items() }
+            timeline = [self.build_animation(child) for child in node.children]
+            nodes = [ao.animation for ao in timeline]
+
+            if node.is_async:
+                for item in timeline:
+                    if item.animation_method not in ('shift', 'scale', 'rotate'):
                         raise Director.ExecutionException(
-                            f'Config `{k}` is invalid'
+                            f'Only shift, scale and rotate can be played asynchronously'
                         )
+                # Every target goes through all transforms of the controller, composed once per target
+                fused = Director._fuse_transforms([(item.animation_method, item.invoke_params) for item in timeline])
+                nodes = [_manim().ApplyFunction(fused, item.related) for item in timeline]
+
+            # A controller times its animations by their own run time, not by the play arguments they were built with
+            for animation, item in zip(nodes, timeline):
+                if 'run_time' not in item.execution_cfg:
+                    continue
+                if hasattr(animation, 'set_anim_args'):
+                    # `.animate` builders take it as an animation argument
+                    animation.set_anim_args(run_time=item.execution_cfg['run_time'])
+                else:
+                    animation.run_time = item.execution_cfg['run_time']
+
+            sys.stderr.write(f'渲染动画序列：{nodes}\n')
+            return Director.AnimationWithPlayArguments(animation_controller(
+                *nodes,
+                **controller_params
+            ), node.cfg, None, [])
+        elif isinstance(action_object, str):
+            return getattr(self.__class__, f'_pack_{action_object}')(
+                self, node.target, node.params, node.properties, node.cfg
+            )
+        return Director._pack_simple(
+            self, action_object, node.target, node.params, node.properties, node.cfg
+        )
 
-                if 'target' not in action:
-                        raise Director.ExecutionException('An action target must be specified')
-                
-                if action_cargs:
-                    if 'params' not in action or (len(action['params']) != action_cargs and action_cargs != -1) or (len(action['params']) < 1 and action_cargs == -1):
-                        warnings.warn(f'Unsufficient positional arguments for action `{action_name}`')
-
-                if 'properties' not in action and len(action_kwargs):
-                    warnings.warn(f'Missing properties for `{action_name}`')
-                
-                elif len(action_kwargs):
-                    for a in action_kwargs:
-                        if a not in action['properties'].keys():
-                            warnings.warn(f'Missing property \'{a}\' for `{action_name}`')
-
-                result.append(Director._pack_simple(
-                    self,
-                    action_object,
-                    action['target'],
-                    [] if 'params' not in action else action['params'],
-                    {} if 'properties' not in action else action['properties'],
-                    cfg
-                ))  
+    def generate_action_sequence(self, seq: list[Any]) -> list[AnimationWithPlayArguments]:
+        result = []
+        for action in seq:
+            for node in self.compile_action(action):
+                result.append(self.build_animation(node))
         return result
 
+    def play_step(self, step: PlayStep) -> None:
+        with tracer.span(f'{step.kind} {step.location}', step.kind, action=step.node.action) as span:
+            if step.kind == 'wait':
+                self.target.wait(step.node.params[0])
+            elif step.kind == 'add':
+                self.target.add(self.om.get_object(step.node.target))
+            else:
+                ao = self.build_animation(step.node)
+                self.target.play(ao.animation, **ao.execution_cfg)
+
+            if tracer.enabled and step.kind != 'add':
+                duration = getattr(self.target, 'duration', 0) or 0
+                span.annotate(duration=duration, frames=math.ceil(duration * _manim().config.frame_rate))
+
     def start_play(self) -> None:
         if self.target is None:
             raise Director.ExecutionException(
                 f'Show has not been set'
             )
-        
-        for scene in self.actions:
-            for action in scene['procedure']:
-                if 'action' not in action:
-                    raise Director.ExecutionException('An action must be specified')
-                action_name = action['action']
-                if action_name not in Director.executions:
-                    raise Director.ExecutionException(
-                        f'Action `{action_name}` is unsupported'
-                    )
-                
-                action_object, action_cargs, action_kwargs = Director.executions[action_name]
-                cfg = {}
-                        
-                if isinstance(action_object, int):
-                    if 'params' not in action and action_object != -3:
-                        raise Director.ExecutionException('Missing parameters')
-
-                    if action_object == -1:
-                        if len(action['params']) != 1 or len(action.keys()) != 2:
-                            raise Director.ExecutionException('Invalid parameters for action `wait`')
-                        self.target.wait(action['params'][0])
-                    elif action_object == -2:
-                        cache = []
-                        if 'target' not in action:
-                            raise Director.ExecutionException('Missing general target for selection')
-                        elif 'params' not in action:
-                            raise Director.ExecutionException('Missing replacement parameters for selection')
-                        elif 'properties' not in action:
-                            raise Director.ExecutionException('Missing actions for selection')
-                        else:
-                            if not isinstance(action['params'], list):
-                                action['params'] = eval(action['params'])
-
-                            for param in action['params']:
-                                action_details = action['properties']
-                                action_details['target'] = action['target'].format(param)
-                                for sub_actions in self.generate_action_sequence([action_details]):
-                                    cache.append(sub_actions)
-                        for c in cache:
-                            self.target.play(c, **c.execution_cfg)
-                    elif action_object == -3:
-                        if 'target' not in action:
-                            raise Director.ExecutionException('Missing target to add')
-                        self.target.add(self.om.get_object(action['target']))
 
-                    else:
-                        for k, v in action.items():
-                            if k in ('action', 'target', 'params', 'properties', 'async'):
-                                continue
-                            elif k in Director.basic_property.keys():
-                                cfg[Director.basic_property[k]] = v
-                            else:
-                                raise Director.ExecutionException(
-                                    f'Config `{k}` is invalid'
-                                )
-
-                        if 'target' in action:
-                            raise Director.ExecutionException('Animation controller use parameters as target')
-                        if 'params' not in action:
-                            raise Director.ExecutionException('Animation controller needs an animated sequence as paramater')
-                        animation_controller = Director.animation_controller_mapping[action_object]
-
-                        controller_params = {} if 'properties' not in action else {
-                            action_kwargs[k]: v for k, v in action['properties'].items()
-                        }
-
-                        timeline = [ao for ao in self.generate_action_sequence(action['params'])]
-                        nodes = [ao.animation for ao in timeline]
-
-                        if 'async' in action and action['async']:
-                            nodes = []
-                            def _method(m):
-                                for node in timeline:
-                                    getattr(m, node.animation_method)(*node.invoke_params)
-                                return m
-                            
-                            for i in timeline:
-                                nodes.append(ApplyFunction(_method, i.related))
-
-                        sys.stderr.write(f'渲染动画序列：{nodes}\n')
-                        self.target.play(animation_controller(
-                            *nodes,
-                            **controller_params
-                        ), **cfg)
-
-                elif isinstance(action_object, str):
-                    for k, v in action.items():
-                        if k in ('action', 'target', 'params', 'properties'):
-                            continue
-                        if k in Director.basic_property:
-                            cfg[Director.basic_property[k]] = v
-                        else:
-                            raise Director.ExecutionException(
-                                f'Config `{k}` is invalid'
-                            )
-
-                    if 'params' not in action:
-                        raise Director.ExecutionException('Missing parameters')
-                    if 'target' not in action:
-                            raise Director.ExecutionException('An action target must be specified')
-                    
-                    getattr(self.__class__, f'_execute_{action_object}')(
-                        self, 
-                        action['target'],
-                        action['params'],
-                        {} if 'properties' not in action else action['properties'],
-                        cfg
-                    )
-                else:
-                    for k, v in action.items():
-                        if k in ('action', 'target', 'params', 'properties'):
-                            continue
-                        if k in Director.basic_property:
-                            cfg[Director.basic_property[k]] = v
-                        else:
-                            raise Director.ExecutionException(
-                                f'Config `{k}` is invalid'
-                            )
-
-                    if 'target' not in action:
-                            raise Director.ExecutionException('An action target must be specified')
-                    
-                    if action_cargs:
-                        if 'params' not in action or len(action['params']) != action_cargs:
-                            warnings.warn(f'Unsufficient positional arguments for action `{action_name}`')
-
-                    if 'properties' not in action and len(action_kwargs):
-                        warnings.warn(f'Missing properties for `{action_name}`')
-                    
-                    elif len(action_kwargs):
-                        for a in action_kwargs:
-                            if a not in action['properties'].keys():
-                                warnings.warn(f'Missing property \'{a}\' for `{action_name}`')
-
-                    Director._execute_simple(
-                        self,
-                        action_object,
-                        action['target'],
-                        [] if 'params' not in action else action['params'],
-                        {} if 'properties' not in action else action['properties'],
-                        cfg
+        plan = self.plan if self.plan is not None else self.compile()
+        for section, steps in itertools.groupby(enumerate(plan.steps), key=lambda item: item[1].section):
+            with tracer.span(section, 'section') as span:
+                released = 0
+                for i, step in steps:
+                    self.play_step(step)
+                    if self.releases is not None:
+                        for name in self.releases.get(i, ()):
+                            self.release(name)
+                            released += 1
+
+                if self.releases is not None:
+                    memory = Director.memory_usage()
+                    mobjects = len(getattr(self.target, 'mobjects', ()))
+                    span.annotate(released=released, mobjects=mobjects, rss=memory)
+                    sys.stderr.write(
+                        f'片段 {section}：释放 {released} 个对象，场景中 {mobjects} 个对象，内存 {memory / 1048576:.1f} MB\n'
                     )
+
+    def stream_play(self) -> None:
+        '''
+        Reads, plans and plays the actions file one section at a time, only the current
+        section is kept in memory and a lazy manager builds the objects it needs just before
+
+        Errors are reported per section, after earlier sections have already been played
+        '''
+        if self.target is None:
+            raise Director.ExecutionException(
+                f'Show has not been set'
+            )
+
+        for section, procedure in self.sections():
+            steps, errors = self.compile_section(section, procedure, remember=False)
+            if errors:
+                raise Director.PlanException(errors)
+            if self.om.lazy:
+                self.om.materialize(self.collect_targets([procedure]))
+            with tracer.span(section, 'section'):
+                for step in steps:
+                    self.play_step(step)
+
+
+class PlanCache:
+    '''
+    Parsed scripts and compiled action plans of previous runs, pickled next to the
+    sources and keyed by the content of both files and of the helper itself
+
+    When nothing changed, json parsing, name normalization, dependency validation and
+    plan compilation are all skipped, a project keeps one entry at a time
+    '''
+    _helper_digest: str | None = None
+
+    def __init__(self, directory: str | None = None) -> None:
+        # None stores entries in `.manim_helper_cache/plans` next to every script
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def helper_digest() -> str:
+        if PlanCache._helper_digest is None:
+            with open(__file__, 'rb') as f:
+                PlanCache._helper_digest = hashlib.sha256(f.read()).hexdigest()
+        return PlanCache._helper_digest
+
+    def path(self, script: str, actions: str) -> tuple[str, str]:
+        '''
+        Entry path of the current content, and the prefix shared by every entry of the project
+        '''
+        script, actions = os.path.abspath(script), os.path.abspath(actions)
+        directory = self.directory or os.path.join(os.path.dirname(script), '.manim_helper_cache', 'plans')
+        project = hashlib.sha256(f'{script}\0{actions}'.encode('utf-8')).hexdigest()[:16]
+        content = hashlib.sha256(PlanCache.helper_digest().encode('utf-8'))
+        for source in (script, actions):
+            with open(source, 'rb') as f:
+                content.update(hashlib.sha256(f.read()).digest())
+        prefix = os.path.join(directory, project)
+        return f'{prefix}.{content.hexdigest()[:32]}.pickle', prefix
+
+    def load(self, path: str) -> dict[str, Any] | None:
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                entry = pickle.loads(data)
+        except Exception:
+            # Missing, truncated or written by an incompatible version, all mean rebuild
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, path: str, prefix: str, entry: dict[str, Any]) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        for name in os.listdir(directory):
+            stale = os.path.join(directory, name)
+            if stale.startswith(f'{prefix}.') and stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def open(self, script: str, actions: str, lazy: bool = False, cache: MObjectCache | None = None) -> Director:
+        '''
+        A director with its plan compiled, `director.om` holds the objects (built unless `lazy`)
+        '''
+        path, prefix = self.path(script, actions)
+        manager = MObjectManager(lazy, cache)
+        with tracer.span('load plan cache', 'load', file=path):
+            entry = self.load(path)
+        if entry is not None:
+            manager.add_objects(entry['definitions'])
+            director = Director(manager, actions)
+            director.actions = entry['actions']
+            director.plan = entry['plan']
+            manager.update_attributes(entry['order'])
+            return director
+
+        definitions = [(TextLoader.format_name(k), v) for k, v in TextLoader(script).load().items()]
+        manager.add_objects(definitions)
+        order = manager.build_order()
+        manager.update_attributes(order)
+        director = Director(manager, actions)
+        director.load_actions()
+        director.compile()
+        self.store(path, prefix, {
+            'definitions': definitions, 'order': order, 'actions': director.actions, 'plan': director.plan
+        })
+        return director
+
+    def stats(self) -> dict[str, int]:
+        return { 'hits': self.hits, 'misses': self.misses }
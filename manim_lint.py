@@ -0,0 +1,51 @@
+import os
+import sys
+import argparse
+
+import manim_helper
+
+
+def lint(script: str, actions: str | None = None) -> list[str]:
+    '''
+    Validates a script file (and optionally an actions file against it) without
+    building any object, manim does not need to be installed
+    '''
+    try:
+        loader = manim_helper.TextLoader(script)
+        content = loader.load()
+        manager = manim_helper.MObjectManager(lazy=True)
+        manager.add_objects((manim_helper.TextLoader.format_name(k), v) for k, v in content.items())
+    except (manim_helper.TextLoader.LoadException, manim_helper.MObjectManager.InvalidObjectException) as e:
+        return [f'{script}: {e}']
+
+    errors = [f'{script}: {error}' for error in manager.validate()]
+    if actions is None or errors:
+        return errors
+
+    director = manim_helper.Director(manager, actions)
+    try:
+        director.load_actions()
+        director.compile()
+    except manim_helper.Director.PlanException as e:
+        errors.extend(f'{actions}: {error}' for error in e.errors)
+    except manim_helper.Director.ExecutionException as e:
+        errors.append(f'{actions}: {e}{f" ({e.__cause__})" if e.__cause__ else ""}')
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='manim-helper script and action linter')
+    parser.add_argument(
+        'files', nargs='+', metavar=f'SCRIPT[{os.pathsep}ACTIONS]',
+        help=f'script files, optionally paired with an actions file (separated by `{os.pathsep}`)'
+    )
+    args = parser.parse_args()
+
+    failed = 0
+    for item in args.files:
+        script, _, actions = item.partition(os.pathsep)
+        errors = lint(script, actions or None)
+        for error in errors:
+            sys.stderr.write(f'{error}\n')
+        failed += bool(errors)
+    exit(1 if failed else 0)
@@ -1,56 +1,354 @@
 import os
 import sys
 import time
+import atexit
 import uuid
+import argparse
+import subprocess
 
+import manim_render
+# Read before `--trace` sets the variable, so the loader itself never traces
+# (its own trace would be written last, over the one of the manim process)
+from manim_trace import tracer
 
-sample = '''
-# Generated by manim_helper at {}
 
-from manim import *
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='manim-helper loader')
+    parser.add_argument('scene', nargs='?', help='name of the generated scene')
+    parser.add_argument('script', nargs='?', help='script file describing the objects')
+    parser.add_argument('actions', nargs='?', help='actions file describing the animation')
+    parser.add_argument('--lazy', action='store_true', help='only build objects used by the actions')
+    parser.add_argument(
+        '--object-cache', nargs='?', const='.manim_helper_cache/objects', default=None, metavar='DIR',
+        help='reuse text and tex objects built by previous runs'
+    )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='read and play the actions one section at a time (for very large .jsonl scripts and actions)'
+    )
+    parser.add_argument(
+        '--plan-cache', nargs='?', const='', default=None, metavar='DIR',
+        help='reuse the parsed script and compiled plan while both files are unchanged '
+             '(stored in .manim_helper_cache/plans next to the script unless DIR is given)'
+    )
+    parser.add_argument(
+        '--optimize', nargs='?', const='fast', choices=('fast', 'strict'), default=None,
+        help='merge adjacent independent animations into one play, `strict` keeps every frame identical'
+    )
+    parser.add_argument(
+        '--release-dead', action='store_true',
+        help='remove objects from the scene and free them after their last use, and report memory per section'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='always render, even when a finished video of the same inputs is in .manim_helper_cache/outputs'
+    )
+    parser.add_argument(
+        '--profile', nargs='+', choices=tuple(manim_render.render_profiles), metavar='PROFILE',
+        help='render with one or more profiles sharing one plan and report the time of each: '
+             '`lastframe` (a png per section), `keyframes` (a png per interval), `draft` (low quality) or `final`'
+    )
+    parser.add_argument(
+        '--keyframe-interval', type=float, default=1.0, metavar='SECONDS', help='seconds between keyframes'
+    )
+    parser.add_argument('--dry-run', action='store_true', help='validate and time the action plan without rendering')
+    parser.add_argument(
+        '--parallel', type=int, default=0, metavar='JOBS',
+        help='render top-level action sections in up to JOBS manim processes'
+    )
+    parser.add_argument(
+        '--incremental', nargs='?', const='.manim_helper_cache/sections', default=None, metavar='DIR',
+        help='only re-render sections that changed since a previous run'
+    )
+    parser.add_argument(
+        '--spool', metavar='DIR',
+        help='queue the sections as jobs in DIR (a directory shared with `manim_spool.py work DIR` workers) and stitch the result'
+    )
+    parser.add_argument('--local-workers', type=int, default=0, metavar='N', help='spool workers to start on this machine')
+    parser.add_argument('--lease', type=float, default=60.0, metavar='SECONDS', help='spool heartbeat timeout before a job is retried')
+    parser.add_argument('--watch', action='store_true', help='keep running and re-render at draft quality on every change')
+    parser.add_argument('--daemon', metavar='ADDRESS', help='send the job to a running manim_daemon.py instead')
+    parser.add_argument(
+        '--trace', metavar='PATH',
+        help='record timing spans to PATH (json) and PATH.chrome.json (chrome trace events)'
+    )
+    parser.add_argument('--manifest', metavar='FILE', help='render every job listed in a json or csv manifest')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='concurrent renders in manifest mode')
+    parser.add_argument(
+        '--retries', type=int, default=None,
+        help='retries of a failed job in manifest mode (default 0) and spool mode (default 2)'
+    )
+    parser.add_argument('--quality', choices=('l', 'm', 'h', 'p', 'k'), help='default render quality in manifest mode')
+    parser.add_argument('--media-dir', default='media', help='output directory in manifest, watch and daemon mode')
+    parser.add_argument('--log-dir', default='manim_helper_logs', help='per-job logs in manifest mode')
+    args = parser.parse_args()
+    if not args.manifest and not (args.scene and args.script and args.actions):
+        parser.error('<scene> <script-file> <actions-file> are required unless --manifest is given')
+    return args
 
-import manim_helper
 
-class {}(Scene):
+def run_manifest(args: argparse.Namespace) -> int:
+    try:
+        jobs = manim_render.load_manifest(args.manifest)
+    except manim_render.RenderException as e:
+        sys.stderr.write(f'{e}\n')
+        return 1
+    for job in jobs:
+        job.quality = job.quality or args.quality
 
-    def prepare(self) -> None:
-        loader = manim_helper.TextLoader("{}")
-        text_data = loader.load()
-        self.objects = loader.apply(text_data)
-        self.director = manim_helper.Director(self.objects, "{}")
+    print(f'manim-helper: \n  批量渲染：{len(jobs)} 个工程，{args.jobs} 个进程')
+    st = time.time()
+    results = manim_render.run_batch(
+        jobs, args.jobs, args.media_dir, args.log_dir, args.retries or 0, args.lazy, args.object_cache,
+        None if args.no_cache else manim_render.OutputCache()
+    )
+    failed = [r for r in results if r.returncode]
+    print(f'批量渲染完毕：成功 {len(results) - len(failed)} 个，失败 {len(failed)} 个，总用时：{round(time.time() - st, 8)} secs')
+    return 1 if failed else 0
+
+
+def watch(args: argparse.Namespace, interval: float = 0.5) -> int:
+    session = manim_render.WarmSession(
+        args.scene, args.script, args.actions, media_dir=args.media_dir, object_cache=args.object_cache
+    )
+    print('  监视模式：修改脚本或动画序列后将自动重新渲染（Ctrl+C 退出）')
+    error = None
+    try:
+        while True:
+            st = time.time()
+            try:
+                changes = session.refresh()
+                if changes is not None:
+                    objects, sections = changes
+                    output = session.render()
+                    print(
+                        f'  重新渲染完毕：重建 {len(objects)} 个对象，{len(sections)} 个片段有变化，'
+                        f'用时：{round(time.time() - st, 8)} secs，输出文件：{output}'
+                    )
+                error = None
+            except Exception as e:
+                # A broken file is retried on every poll, report it once
+                if f'{type(e).__name__}: {e}' != error:
+                    error = f'{type(e).__name__}: {e}'
+                    sys.stderr.write(f'渲染失败：{error}\n')
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def submit(args: argparse.Namespace) -> int:
+    import manim_daemon
+
+    st = time.time()
+    config = { 'media_dir': os.path.abspath(args.media_dir) }
+    if args.object_cache:
+        config['object_cache'] = os.path.abspath(args.object_cache)
+    job = {
+        'scene': args.scene, 'script': os.path.abspath(args.script), 'actions': os.path.abspath(args.actions),
+        'config': config
+    }
+    try:
+        address = manim_daemon.parse_address(args.daemon)
+    except ValueError as e:
+        sys.stderr.write(f'渲染失败：{e}\n')
+        return 1
+    for event in manim_daemon.submit(address, job):
+        if event['event'] == 'error':
+            sys.stderr.write(f'渲染失败：{event["message"]}\n')
+            return 1
+        elif event['event'] == 'done':
+            print(f'  输出文件：{event["output"]}，渲染用时：{event["seconds"]} secs，总用时：{round(time.time() - st, 8)} secs')
+        else:
+            sys.stderr.write(f'  {event}\n')
+    return 0
+
+
+def render_profiles(args: argparse.Namespace, filename: str) -> int:
+    st = time.time()
+    plan_cache = '' if args.plan_cache is None else args.plan_cache
+    # Compiled once here, every manim process below loads it from the plan cache
+    ranges = manim_render.director_ranges(
+        manim_render.load_director(args.script, args.actions, plan_cache, args.optimize)
+    )
+    print(f'  生成动画计划用时：{round(time.time() - st, 8)} secs，{len(ranges)} 个片段')
+
+    for profile in args.profile:
+        st = time.time()
+        media_dir = 'media' if profile == 'final' else os.path.join('media', profile)
+        try:
+            outputs = manim_render.render_profile(
+                filename, args.scene, profile, ranges, media_dir, max(1, args.parallel), args.keyframe_interval
+            )
+        except manim_render.RenderException as e:
+            sys.stderr.write(f'{profile} 渲染失败：{e}\n')
+            return 1
+        location = outputs[0] if len(outputs) == 1 else f'{len(outputs)} 个文件，位于 {media_dir}'
+        print(f'  {profile}：用时 {round(time.time() - st, 8)} secs，输出：{location}')
+    return 0
+
+
+def render_sections(args: argparse.Namespace, filename: str) -> int:
+    import manim_helper
 
-    def construct(self) -> None:
-        self.prepare()
-        self.director.set_target_show(self)
-        self.director.load_actions()
-        self.director.start_play()   
-'''
+    output = os.path.join('media', 'videos', args.scene, f'{args.scene}.mp4')
+    try:
+        if args.incremental:
+            director = manim_render.load_director(args.script, args.actions, args.plan_cache, args.optimize)
+            reused, rendered = manim_render.render_incremental(
+                filename, director, args.scene, max(1, args.parallel), output, args.incremental,
+                sources=(args.script, args.actions)
+            )
+            print(f'  增量渲染：复用 {reused} 个片段，重新渲染 {rendered} 个片段')
+        else:
+            ranges = manim_render.plan_sections(args.script, args.actions, args.plan_cache, args.optimize)
+            sys.stderr.write(f'并行渲染：{len(ranges)} 个片段，{args.parallel} 个进程\n')
+            manim_render.render_parallel(filename, args.scene, ranges, args.parallel, output)
+    except manim_helper.Director.PlanException as e:
+        sys.stderr.write(f'渲染失败：动画序列存在 {len(e.errors)} 处错误：\n')
+        for error in e.errors:
+            sys.stderr.write(f'  {error}\n')
+        return 1
+    except (manim_render.RenderException, manim_helper.TextLoader.LoadException, manim_helper.MObjectManager.InvalidObjectException, manim_helper.Director.ExecutionException) as e:
+        sys.stderr.write(f'渲染失败：{e}\n')
+        return 1
+    print(f'  输出文件：{output}')
+    return 0
 
 
+def render_spool(args: argparse.Namespace) -> int:
+    import manim_spool
+
+    spool = manim_spool.Spool(args.spool, args.lease)
+    output = os.path.join('media', 'videos', args.scene, f'{args.scene}.mp4')
+    workers = []
+    try:
+        project = spool.submit(
+            args.scene, args.script, args.actions, optimize=args.optimize, release=args.release_dead,
+            max_attempts=(2 if args.retries is None else args.retries) + 1
+        )
+        print(f'  分布式渲染：工程 {project}，{spool.status(project)["pending"]} 个片段，本机 {args.local_workers} 个渲染节点')
+        workers = manim_spool.start_local_workers(spool.directory, args.local_workers, args.lease)
+        spool.wait(project, output)
+    except manim_render.RenderException as e:
+        sys.stderr.write(f'分布式渲染失败：{e}\n')
+        return 1
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+    print(f'  输出文件：{output}')
+    return 0
+
+
+def preview(path: str) -> None:
+    # What `manim -p` does with a finished video
+    try:
+        if sys.platform == 'win32':
+            os.startfile(path)
+        else:
+            subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        sys.stderr.write(f'无法打开预览：{e}\n')
+
+
+def dry_run(script: str, actions: str, optimize: str | None = None) -> int:
+    import manim_helper
+
+    st = time.time()
+    try:
+        loader = manim_helper.TextLoader(script)
+        objects = loader.apply(loader.load(), lazy=True)
+        director = manim_helper.Director(objects, actions)
+        director.load_actions()
+        report = director.dry_run(optimize)
+    except manim_helper.Director.PlanException as e:
+        sys.stderr.write(f'动画序列存在 {len(e.errors)} 处错误：\n')
+        for error in e.errors:
+            sys.stderr.write(f'  {error}\n')
+        return 1
+    except (manim_helper.TextLoader.LoadException, manim_helper.MObjectManager.InvalidObjectException, manim_helper.Director.ExecutionException, ImportError) as e:
+        sys.stderr.write(f'校验失败：{e}\n')
+        return 1
+
+    print(f'  校验通过：{report["steps"]} 个步骤，{report["animations"]} 段动画，预计时长 {round(report["duration"], 3)} secs')
+    for section, info in report['sections'].items():
+        print(f'    {section}: {info["steps"]} 个步骤，预计时长 {round(info["duration"], 3)} secs')
+    print(f'  生成动画计划用时：{report["compile_ms"]} ms，总用时：{round(time.time() - st, 8)} secs')
+    return 0
+
     
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
-        sys.stderr.write(f'Usage: ./{sys.argv[0]} <scene> <script-file> <actions-file>\n')
-        exit(1)
+    args = parse_arguments()
+    if args.trace:
+        # Inherited by every manim process started below
+        trace = os.path.abspath(args.trace)
+        if args.manifest or args.parallel or args.incremental or args.spool or args.profile:
+            root, ext = os.path.splitext(trace)
+            trace = f'{root}.{{pid}}{ext}'
+        os.environ['MANIM_HELPER_TRACE'] = trace
+        if args.watch:
+            # Watch mode renders in this process
+            tracer.enable()
+            atexit.register(tracer.export, trace)
 
-    __scene_name__ = sys.argv[1]
-    script = sys.argv[2]
-    actions = sys.argv[3]
+    if args.manifest:
+        exit(run_manifest(args))
+
+    __scene_name__ = args.scene
+    script = args.script
+    actions = args.actions
 
     print(f'manim-helper: \n  渲染工程： {__scene_name__}, 脚本文件： {script}, 动画序列： {actions}')
 
+    if args.dry_run:
+        exit(dry_run(script, actions, args.optimize))
+    if args.watch:
+        exit(watch(args))
+    if args.daemon:
+        exit(submit(args))
+
+    outputs = key = None
+    if not args.no_cache and not args.profile:
+        outputs = manim_render.OutputCache()
+        # Section renders write the video elsewhere than manim and never preview it
+        sections = bool(args.spool or args.incremental or args.parallel)
+        key = outputs.key(
+            __scene_name__, script, actions, [f'optimize={args.optimize}', f'release={args.release_dead}', f'sections={sections}']
+        )
+        output = outputs.restore(key, 'media', __scene_name__)
+        if output is not None:
+            print(f'  输入未变化，使用缓存的视频：{output}')
+            if not sections:
+                preview(output)
+            exit(0)
+
     # filename = f'{uuid.uuid1()}__cache.py'
-    filename = __scene_name__ + '.py'
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(sample.format(
-            time.strftime('%y-%m-%d_%H-%M-%S', time.localtime(time.time())),
-            __scene_name__, script, actions
-        ))
+    filename = manim_render.write_scene(
+        __scene_name__ + '.py', __scene_name__, script, actions, args.lazy, args.object_cache, args.stream,
+        '' if args.profile and args.plan_cache is None else args.plan_cache, args.optimize, args.release_dead
+    )
 
     st = time.time()
-    if sys.platform == 'linux':
-        os.system(f'manim -p "{filename}" {__scene_name__} > /dev/null')
+    if args.profile:
+        if render_profiles(args, filename):
+            exit(1)
+    elif args.spool:
+        if render_spool(args):
+            exit(1)
+    elif args.incremental or args.parallel:
+        if render_sections(args, filename):
+            exit(1)
     else:
-        os.system(f'manim -p "{filename}" {__scene_name__}')
+        returncode = subprocess.run(
+            ['manim', '-p', filename, __scene_name__], stdout=subprocess.DEVNULL if sys.platform == 'linux' else None
+        ).returncode
+        if returncode:
+            sys.stderr.write(f'渲染失败：manim 退出码 {returncode}\n')
+            exit(1)
     # os.remove(filename)
+    if outputs is not None:
+        output = manim_render.find_output('media', __scene_name__)
+        # An older video left by a previous run must not be cached under the new inputs
+        if output is not None and os.path.getmtime(output) >= st:
+            outputs.put(key, output, 'media')
     print(f'工程： {__scene_name__} 渲染完毕，总用时：{round(time.time() - st, 8)} secs')
@@ -0,0 +1,796 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import shutil
+import hashlib
+import dataclasses
+import tempfile
+import subprocess
+from typing import Any
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+
+scene_template = '''
+# Generated by manim_helper at {time}
+
+import sys
+sys.path.insert(0, {helper_dir!r})
+
+from manim import *
+
+import manim_helper
+
+class {scene}(Scene):
+
+    def prepare(self) -> None:
+{load}
+
+    def construct(self) -> None:
+        self.prepare()
+        self.director.set_target_show(self)
+{play}
+'''
+
+play_template = '''
+        loader = manim_helper.TextLoader({script!r})
+        text_data = loader.load()
+        self.objects = loader.apply(text_data, lazy={lazy}, cache={cache})
+        self.director = manim_helper.Director(self.objects, {actions!r})
+---
+        self.director.load_actions()
+        if self.objects.lazy:
+            self.director.materialize()
+{optimize}{liveness}        self.director.start_play()
+'''
+
+stream_template = '''
+        loader = manim_helper.TextLoader({script!r})
+        self.objects = loader.stream(lazy=True, cache={cache})
+        self.director = manim_helper.Director(self.objects, {actions!r})
+---
+        self.director.stream_play()
+'''
+
+plan_cache_template = '''
+        plans = manim_helper.PlanCache({plan_cache!r})
+        self.director = plans.open({script!r}, {actions!r}, lazy={lazy}, cache={cache})
+        self.objects = self.director.om
+---
+        if self.objects.lazy:
+            self.director.materialize()
+{optimize}{liveness}        self.director.start_play()
+'''
+
+
+class RenderException(Exception):
+    pass
+
+
+def write_scene(
+    filename: str, scene: str, script: str, actions: str, lazy: bool = False, object_cache: str | None = None,
+    stream: bool = False, plan_cache: str | None = None, optimize: str | None = None, release: bool = False
+) -> str:
+    '''
+    Writes the scene file manim renders, `stream` reads and plays the actions one
+    section at a time (see `Director.stream_play`) and always builds objects lazily,
+    otherwise `plan_cache` (a directory, `''` for next to the script) reuses the plan
+    of a previous run, `optimize` (`fast` or `strict`) merges plays (see `Director.optimize`)
+    and `release` drops objects after their last use (see `Director.analyze_liveness`)
+    '''
+    template = stream_template if stream else play_template if plan_cache is None else plan_cache_template
+    load, play = template.format(
+        script=script, actions=actions, lazy=lazy, plan_cache=os.path.abspath(plan_cache) if plan_cache else None,
+        optimize=f'        self.director.optimize(strict={optimize == "strict"})\n' if optimize else '',
+        liveness='        self.director.analyze_liveness()\n' if release else '',
+        cache=f'manim_helper.MObjectCache({os.path.abspath(object_cache)!r})' if object_cache else None
+    ).strip('\n').split('\n---\n')
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(scene_template.format(
+            time=time.strftime('%y-%m-%d_%H-%M-%S', time.localtime(time.time())),
+            helper_dir=os.path.dirname(os.path.abspath(__file__)),
+            scene=scene, load=load, play=play
+        ))
+    return filename
+
+
+def section_ranges(plan: Any) -> list[tuple[str, int, int]]:
+    '''
+    Splits a `Director.ActionPlan` into `(section, first, last + 1)` animation number ranges
+
+    Sections without any animation (only `add`) are merged into the following section
+    '''
+    ranges = []
+    start = count = 0
+    pending = []
+    for section in plan.sections:
+        count += sum(1 for step in plan.section_steps(section) if step.kind != 'add')
+        pending.append(section)
+        if count > start:
+            ranges.append(('+'.join(pending), start, count))
+            start = count
+            pending = []
+    return ranges
+
+
+def range_steps(plan: Any, ranges: list[tuple[str, int, int]]) -> list[list[Any]]:
+    '''
+    Plan steps belonging to every range, `add` steps go with the next animation
+    '''
+    groups = [[] for _ in ranges]
+    count = i = 0
+    for step in plan.steps:
+        while i < len(ranges) - 1 and count >= ranges[i][2]:
+            i += 1
+        groups[i].append(step)
+        if step.kind != 'add':
+            count += 1
+    return groups
+
+
+def load_director(script: str, actions: str, plan_cache: str | None = None, optimize: str | None = None) -> Any:
+    '''
+    A director with its plan compiled against a lazy manager (no object is built),
+    `optimize` has to match the one of the scene for animation numbers to agree
+    '''
+    import manim_helper
+
+    if plan_cache is not None:
+        director = manim_helper.PlanCache(plan_cache or None).open(script, actions, lazy=True)
+    else:
+        loader = manim_helper.TextLoader(script)
+        director = manim_helper.Director(loader.apply(loader.load(), lazy=True), actions)
+        director.load_actions()
+        director.compile()
+    if optimize:
+        director.optimize(strict=optimize == 'strict')
+    return director
+
+
+def director_ranges(director: Any) -> list[tuple[str, int, int]]:
+    '''
+    The ranges of `section_ranges` that can be rendered separately
+
+    A range starting past the first animation relies on manim's skip mode, which runs every
+    skipped animation as a single update: updaters (`associate`) that are not idempotent
+    would start the range in another state, so with updaters the scene is one range
+    '''
+    ranges = section_ranges(director.plan)
+    if len(ranges) > 1 and director.om.updater_dependencies():
+        sys.stderr.write(f'对象含有更新函数（associate），{len(ranges)} 个片段将按顺序合并为 1 个渲染\n')
+        return [('+'.join(section for section, _, _ in ranges), 0, ranges[-1][2])]
+    return ranges
+
+
+def plan_sections(script: str, actions: str, plan_cache: str | None = None, optimize: str | None = None) -> list[tuple[str, int, int]]:
+    return director_ranges(load_director(script, actions, plan_cache, optimize))
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+def helper_digest() -> str:
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in ('manim_helper.py', 'manim_render.py'):
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def find_output(media_dir: str, scene: str) -> str | None:
+    # The newest `<scene>.mp4` manim wrote for a scene file named after the scene
+    found = glob.glob(os.path.join(media_dir, 'videos', scene, '**', f'{scene}.mp4'), recursive=True)
+    return max(found, key=os.path.getmtime) if found else None
+
+
+class OutputCache:
+    '''
+    Finished videos of previous renders, keyed by everything deciding the output: both
+    source files, the files their values refer to, the helper and manim versions, the
+    render options and `manim.cfg`, videos are evicted least recently used first once
+    the cache grows beyond `max_bytes`
+    '''
+
+    def __init__(self, directory: str = '.manim_helper_cache/outputs', max_bytes: int = 4 * 1024 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _file_digest(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def referenced_files(*sources: str) -> list[str]:
+        '''
+        Existing files named by string values of the sources (images, svgs, data files),
+        relative names are looked up next to the source and in the working directory
+        '''
+        import manim_helper
+
+        result = set()
+
+        def walk(value: Any, base: str) -> None:
+            if isinstance(value, dict):
+                for v in value.values():
+                    walk(v, base)
+            elif isinstance(value, list):
+                for v in value:
+                    walk(v, base)
+            elif isinstance(value, str) and 0 < len(value) < 4096 and '\n' not in value:
+                for path in (os.path.join(base, value), value):
+                    if os.path.isfile(path):
+                        result.add(os.path.abspath(path))
+
+        for source in sources:
+            base = os.path.dirname(os.path.abspath(source))
+            for _, value in manim_helper.read_records(source):
+                walk(value, base)
+        return sorted(result - { os.path.abspath(source) for source in sources })
+
+    @staticmethod
+    def environment(sources: tuple[str, ...] | list[str] = (), options: list[str] | None = None) -> str:
+        '''
+        Digest of what decides a render besides the sources themselves: the helper and manim
+        versions, the options, `manim.cfg` and the files the sources refer to
+        '''
+        from importlib import metadata
+
+        try:
+            manim_version = metadata.version('manim')
+        except metadata.PackageNotFoundError:
+            manim_version = ''
+        inputs = OutputCache.referenced_files(*sources)
+        if os.path.isfile('manim.cfg'):
+            inputs.append('manim.cfg')
+        return _digest(
+            helper_digest(), manim_version, options or [],
+            [(path, OutputCache._file_digest(path)) for path in inputs]
+        )
+
+    def key(self, scene: str, script: str, actions: str, options: list[str] | None = None) -> str:
+        return _digest(
+            OutputCache.environment((script, actions), options), scene,
+            [OutputCache._file_digest(path) for path in (script, actions)]
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.mp4')
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key: str, video: str, media_dir: str | None = None) -> str:
+        path = self._path(key)
+        if media_dir is not None:
+            # Where manim wrote it (the quality directory), so that a hit restores it there
+            temporary = f'{path[:-4]}.json.{os.getpid()}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({ 'output': os.path.relpath(video, media_dir) }))
+            os.replace(temporary, f'{path[:-4]}.json')
+        shutil.copyfile(video, f'{path}.{os.getpid()}.tmp')
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.evict()
+        return path
+
+    def restore(self, key: str, media_dir: str, scene: str) -> str | None:
+        '''
+        Copies a cached video to where the render it came from wrote it under `media_dir`
+        (`videos/<scene>/<scene>.mp4` when unknown), returns it or None on a miss
+        '''
+        cached = self.get(key)
+        if cached is None:
+            return None
+        try:
+            with open(f'{cached[:-4]}.json', 'r', encoding='utf-8') as f:
+                output = os.path.join(media_dir, json.loads(f.read())['output'])
+        except (OSError, ValueError, KeyError, TypeError):
+            output = os.path.join(media_dir, 'videos', scene, f'{scene}.mp4')
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        shutil.copyfile(cached, output)
+        return output
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.mp4'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                size = os.path.getsize(path)
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for removed in (path, f'{path[:-4]}.json'):
+                try:
+                    os.remove(removed)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self) -> dict[str, int]:
+        return { 'hits': self.hits, 'misses': self.misses }
+
+
+def _node_references(node: Any) -> set[str]:
+    result = { node.target } if node.target else set()
+    for param in node.params:
+        if isinstance(param, str) and param.startswith('$'):
+            result.add(param[1:])
+    for child in node.children:
+        result |= _node_references(child)
+    return result
+
+
+def _runtime_references(definition: Any) -> set[str]:
+    # Objects read by `associate` updaters at play time (`this.find("name")`), and the
+    # family a member takes its layout from
+    if not isinstance(definition, dict):
+        return set()
+    result = set()
+    if isinstance(definition.get('family'), list):
+        result.add(definition['family'][0])
+    for k in ('associate', 'associate_value'):
+        if isinstance(definition.get(k), str):
+            expr = definition[k]
+            if k == 'associate_value':
+                result.add(expr.split('.')[0])
+            for quote in ('"', "'"):
+                for part in expr.split(f'find({quote}')[1:]:
+                    result.add(part.split(quote)[0])
+    return result
+
+
+def section_fingerprints(
+    director: Any, ranges: list[tuple[str, int, int]], options: list[str] | None = None,
+    sources: tuple[str, ...] = ()
+) -> list[str]:
+    '''
+    Fingerprints every range from its actions, the definitions of the objects it uses and
+    the state of every object touched by earlier ranges, so a change also marks the ranges
+    downstream of it that can see the affected objects
+
+    Every range also depends on the render environment (see `OutputCache.environment`),
+    of which `sources` (the script and actions) give the referenced files
+    '''
+    om = director.om
+    environment = OutputCache.environment(sources, options)
+    state: dict[str, str] = {}
+    result = []
+
+    for steps in range_steps(director.plan, ranges):
+        used = set()
+        for step in steps:
+            used |= _node_references(step.node)
+        required = om.closure(used)
+        pending = list(required)
+        while pending:
+            extra = _runtime_references(om.get_entry(pending.pop()).definition) - required
+            extra = om.closure(name for name in extra if name in om) - required
+            required |= extra
+            pending.extend(extra)
+
+        definitions = { name: om.get_entry(name).definition for name in sorted(required) }
+        fingerprint = _digest(
+            environment,
+            [dataclasses.asdict(step) for step in steps],
+            definitions,
+            sorted(state.items())
+        )
+        for name in used:
+            state[name] = _digest(state.get(name, definitions[name]), fingerprint)
+        result.append(fingerprint)
+    return result
+
+
+def render_incremental(
+    filename: str, director: Any, scene: str, jobs: int, output: str, cache_dir: str,
+    options: list[str] | None = None, sources: tuple[str, ...] = ()
+) -> tuple[int, int]:
+    '''
+    Renders only the ranges whose fingerprint has no movie in `cache_dir` and joins
+    the cached and the new movies, returns the number of reused and rendered ranges
+    '''
+    ranges = director_ranges(director)
+    if not ranges:
+        raise RenderException('Nothing to render, the actions contain no animation')
+    fingerprints = section_fingerprints(director, ranges, options, sources)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = [os.path.join(cache_dir, f'{fingerprint}.mp4') for fingerprint in fingerprints]
+    missing = [i for i, path in enumerate(cached) if not os.path.exists(path)]
+
+    workspace = tempfile.mkdtemp(prefix=f'{scene}-incremental-')
+
+    def render(i: int) -> None:
+        section, start, end = ranges[i]
+        sys.stderr.write(f'渲染片段 {i}：{section}（动画 {start}-{end - 1}）\n')
+        part = render_range(
+            filename, scene, start, end, f'part_{i}', os.path.join(workspace, f'part_{i}'), options,
+            os.path.join(workspace, f'part_{i}.log')
+        )
+        shutil.copyfile(part, cached[i] + '.tmp')
+        os.replace(cached[i] + '.tmp', cached[i])
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            list(pool.map(render, missing))
+        concat_videos(cached, output)
+    except RenderException as e:
+        raise RenderException(f'{e}, logs are kept in `{workspace}`') from e
+
+    shutil.rmtree(workspace, ignore_errors=True)
+    return len(ranges) - len(missing), len(missing)
+
+
+def render_range(
+    filename: str, scene: str, start: int, end: int, output: str, media_dir: str,
+    options: list[str] | None = None, log: str | None = None, cwd: str | None = None
+) -> str:
+    '''
+    Renders animations `start` to `end - 1` of a scene, manim fast-forwards (skips)
+    every animation before `start` so the objects reach their state at the boundary
+    (see `director_ranges` for scenes with updaters), `cwd` is where relative asset paths
+    are resolved
+    '''
+    command = [
+        'manim', '--media_dir', media_dir, '-n', f'{start},{end - 1}', '-o', output,
+        *(options or []), filename, scene
+    ]
+    with open(log or os.devnull, 'w', encoding='utf-8') as f:
+        result = subprocess.run(command, stdout=f, stderr=subprocess.STDOUT, cwd=cwd)
+    if result.returncode:
+        raise RenderException(
+            f'Failed to render animations {start}-{end - 1} of `{scene}` (exit code {result.returncode})'
+        )
+
+    found = glob.glob(os.path.join(media_dir, 'videos', '**', f'{output}.mp4'), recursive=True)
+    if not found:
+        raise RenderException(f'Cannot find rendered video `{output}.mp4`')
+    return found[0]
+
+
+def concat_videos(parts: list[str], output: str) -> str:
+    if not parts:
+        raise RenderException('Nothing to render, the actions contain no animation')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if len(parts) == 1:
+        shutil.copyfile(parts[0], output)
+        return output
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+        listing = f.name
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', listing, '-c', 'copy', output]
+        )
+    finally:
+        os.remove(listing)
+    if result.returncode:
+        raise RenderException(f'Failed to concatenate {len(parts)} videos into `{output}`')
+    return output
+
+
+def render_parallel(
+    filename: str, scene: str, ranges: list[tuple[str, int, int]], jobs: int, output: str,
+    options: list[str] | None = None
+) -> str:
+    '''
+    Renders every section range in its own manim process and joins the partial movies in order
+    '''
+    if not ranges:
+        raise RenderException('Nothing to render, the actions contain no animation')
+    workspace = tempfile.mkdtemp(prefix=f'{scene}-parallel-')
+
+    def render(item: tuple[int, tuple[str, int, int]]) -> str:
+        i, (section, start, end) = item
+        sys.stderr.write(f'渲染片段 {i}：{section}（动画 {start}-{end - 1}）\n')
+        media_dir = os.path.join(workspace, f'part_{i}')
+        return render_range(
+            filename, scene, start, end, f'part_{i}', media_dir, options,
+            os.path.join(workspace, f'part_{i}.log')
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            parts = list(pool.map(render, enumerate(ranges)))
+        concat_videos(parts, output)
+    except RenderException as e:
+        raise RenderException(f'{e}, logs are kept in `{workspace}`') from e
+
+    shutil.rmtree(workspace, ignore_errors=True)
+    return output
+
+
+# Cheapest first: manim options of every render profile, all of them play the same plan
+render_profiles = {
+    'lastframe': ['-s'],
+    'keyframes': ['-ql', '--format', 'png'],
+    'draft': ['-ql'],
+    'final': []
+}
+
+
+def _run_manim(command: list[str], log: str) -> None:
+    os.makedirs(os.path.dirname(log), exist_ok=True)
+    with open(log, 'w', encoding='utf-8') as f:
+        result = subprocess.run(command, stdout=f, stderr=subprocess.STDOUT)
+    if result.returncode:
+        raise RenderException(f'`{" ".join(command)}` failed (exit code {result.returncode}), see `{log}`')
+
+
+def render_profile(
+    filename: str, scene: str, profile: str, ranges: list[tuple[str, int, int]], media_dir: str,
+    jobs: int = 1, interval: float = 1.0
+) -> list[str]:
+    '''
+    Renders a scene with one of `render_profiles` and returns the written files:
+
+        lastframe   a png of the last frame of every section range, animations are skipped
+        keyframes   a low quality png every `interval` seconds
+        draft       a low quality video
+        final       the video at the configured quality
+    '''
+    options = ['manim', '--media_dir', media_dir, *render_profiles[profile]]
+    logs = os.path.join(media_dir, 'logs')
+
+    if profile == 'lastframe':
+        def render(item: tuple[int, tuple[str, int, int]]) -> str:
+            i, (section, start, end) = item
+            output = f'{scene}_section_{i}'
+            _run_manim([*options, '-n', f'{start},{end - 1}', '-o', output, filename, scene], os.path.join(logs, f'{output}.log'))
+            found = glob.glob(os.path.join(media_dir, 'images', '**', f'{output}.png'), recursive=True)
+            if not found:
+                raise RenderException(f'Cannot find the last frame of section `{section}`')
+            return found[0]
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            return list(pool.map(render, enumerate(ranges)))
+
+    if profile == 'keyframes':
+        options += ['--frame_rate', str(1 / interval)]
+    _run_manim([*options, filename, scene], os.path.join(logs, f'{scene}_{profile}.log'))
+    if profile == 'keyframes':
+        return sorted(glob.glob(os.path.join(media_dir, 'images', '**', f'{scene}*.png'), recursive=True))
+    output = find_output(media_dir, scene)
+    if output is None:
+        raise RenderException(f'Cannot find rendered video `{scene}.mp4`')
+    return [output]
+
+
+@dataclass
+class RenderJob:
+    scene: str
+    script: str
+    actions: str
+    quality: str | None = None
+    options: list[str] = field(default_factory=list)
+
+
+@dataclass
+class JobResult:
+    job: RenderJob
+    returncode: int
+    seconds: float
+    attempts: int
+    log: str
+    output: str | None = None
+
+
+def load_manifest(path: str) -> list[RenderJob]:
+    '''
+    Reads render jobs from a json manifest (a list of jobs or `{ "quality": ..., "jobs": [...] }`)
+    or a csv file with `scene,script,actions[,quality]` columns, relative paths are resolved
+    against the manifest location
+    '''
+    base = os.path.dirname(os.path.abspath(path))
+    quality = None
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.lower().endswith('.csv'):
+                records = list(csv.DictReader(f))
+            else:
+                content = json.loads(f.read())
+                if isinstance(content, dict):
+                    quality = content.get('quality')
+                    content = content.get('jobs', [])
+                records = content
+    except (OSError, json.JSONDecodeError, csv.Error) as e:
+        raise RenderException(f'Failed to read manifest `{path}`: {e}') from e
+
+    jobs, scenes = [], set()
+    for i, record in enumerate(records):
+        missing = [k for k in ('scene', 'script', 'actions') if not record.get(k)]
+        if missing:
+            raise RenderException(f'Job {i} in manifest is missing {", ".join(missing)}')
+        if record['scene'] in scenes:
+            raise RenderException(f'Scene `{record["scene"]}` appears more than once in manifest')
+        scenes.add(record['scene'])
+
+        options = record.get('options') or []
+        jobs.append(RenderJob(
+            record['scene'],
+            os.path.join(base, record['script']),
+            os.path.join(base, record['actions']),
+            record.get('quality') or quality,
+            options.split() if isinstance(options, str) else list(options)
+        ))
+    return jobs
+
+
+def run_job(
+    job: RenderJob, media_dir: str, log_dir: str, retries: int = 0, lazy: bool = False,
+    object_cache: str | None = None, output_cache: OutputCache | None = None
+) -> JobResult:
+    '''
+    Renders a single job, failed runs are retried `retries` times
+
+    Only the generated scene file goes to a temporary directory, manim runs in the working
+    directory like a direct render, so relative asset paths and `manim.cfg` are found
+    '''
+    log = os.path.join(log_dir, f'{job.scene}.log')
+    st = time.time()
+    key = None
+    if output_cache is not None:
+        key = output_cache.key(job.scene, job.script, job.actions, [*(['-q', job.quality] if job.quality else []), *job.options])
+        output = output_cache.restore(key, media_dir, job.scene)
+        if output is not None:
+            with open(log, 'w', encoding='utf-8') as f:
+                f.write(f'# cached: {key}\n')
+            return JobResult(job, 0, time.time() - st, 0, log, output)
+
+    workspace = tempfile.mkdtemp(prefix=f'{job.scene}-')
+    filename = write_scene(os.path.join(workspace, f'{job.scene}.py'), job.scene, job.script, job.actions, lazy, object_cache)
+    command = ['manim', '--media_dir', media_dir, *(['-q', job.quality] if job.quality else []), *job.options, filename, job.scene]
+
+    attempts = 0
+    returncode = -1
+    with open(log, 'w', encoding='utf-8') as f:
+        while attempts <= retries:
+            attempts += 1
+            f.write(f'# attempt {attempts}: {" ".join(command)}\n')
+            f.flush()
+            returncode = subprocess.run(command, stdout=f, stderr=subprocess.STDOUT).returncode
+            if not returncode:
+                break
+    shutil.rmtree(workspace, ignore_errors=True)
+
+    output = None
+    if not returncode:
+        output = find_output(media_dir, job.scene)
+        if output is not None and key is not None:
+            output_cache.put(key, output, media_dir)
+    return JobResult(job, returncode, time.time() - st, attempts, log, output)
+
+
+def run_batch(
+    jobs: list[RenderJob], workers: int, media_dir: str, log_dir: str, retries: int = 0,
+    lazy: bool = False, object_cache: str | None = None, output_cache: OutputCache | None = None
+) -> list[JobResult]:
+    '''
+    Schedules the jobs over `workers` concurrent manim processes and writes a summary next to the logs
+    '''
+    media_dir = os.path.abspath(media_dir)
+    os.makedirs(log_dir, exist_ok=True)
+
+    def run(job: RenderJob) -> JobResult:
+        result = run_job(job, media_dir, log_dir, retries, lazy, object_cache, output_cache)
+        state = '失败（退出码 {result.returncode}）' if result.returncode else '完成' if result.attempts else '使用缓存'
+        state = state.format(result=result)
+        sys.stderr.write(f'  {job.scene}: {state}，尝试 {result.attempts} 次，用时 {round(result.seconds, 3)} secs\n')
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(run, jobs))
+
+    with open(os.path.join(log_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps([{
+            'scene': r.job.scene,
+            'returncode': r.returncode,
+            'seconds': round(r.seconds, 3),
+            'attempts': r.attempts,
+            'log': r.log,
+            'output': r.output
+        } for r in results], indent=4, ensure_ascii=False))
+    return results
+
+
+class WarmSession:
+    '''
+    Keeps manim imported and the objects of one project built between renders
+
+    Every render plays on a fork of the built objects, so only definitions that
+    changed on disk (and the objects built from them) are constructed again
+    '''
+
+    def __init__(
+        self, scene: str, script: str, actions: str, quality: str = 'low_quality',
+        media_dir: str = 'media', object_cache: str | None = None
+    ) -> None:
+        import manim_helper
+
+        self.scene = scene
+        self.script = script
+        self.actions = actions
+        self.quality = quality
+        self.media_dir = media_dir
+        self.manager = manim_helper.MObjectManager(
+            lazy=True, cache=manim_helper.MObjectCache(object_cache) if object_cache else None
+        )
+        self.director = manim_helper.Director(self.manager, actions)
+        self._mtimes: dict[str, float] = {}
+
+    def _definitions(self) -> dict[str, Any]:
+        import manim_helper
+
+        loader = manim_helper.TextLoader(self.script)
+        return { manim_helper.TextLoader.format_name(k): v for k, v in loader.load().items() }
+
+    def refresh(self) -> tuple[set[str], list[str]] | None:
+        '''
+        Reloads what changed on disk, returns the objects to rebuild and the changed
+        sections, or None when neither file changed
+        '''
+        mtimes = { path: os.path.getmtime(path) for path in (self.script, self.actions) }
+        if mtimes == self._mtimes:
+            return None
+        script_changed = mtimes[self.script] != self._mtimes.get(self.script)
+        actions_changed = mtimes[self.actions] != self._mtimes.get(self.actions)
+
+        objects = self.manager.reload(self._definitions()) if script_changed else set()
+        if actions_changed:
+            sections = self.director.reload_actions()
+        else:
+            self.director.compile()
+            sections = []
+        # Only after both succeeded, a half written or invalid file is read again next time
+        self._mtimes = mtimes
+        return objects, sections
+
+    def render(self) -> str:
+        import manim
+
+        self.director.materialize()
+        session = self
+
+        def construct(scene: manim.Scene) -> None:
+            director = session.director.fork(session.manager.fork())
+            director.set_target_show(scene)
+            director.start_play()
+
+        scene_class = type(self.scene, (manim.Scene,), { 'construct': construct })
+        with manim.tempconfig({
+            'quality': self.quality,
+            'preview': False,
+            'media_dir': self.media_dir,
+            'input_file': f'{self.scene}.py',
+            'output_file': self.scene
+        }):
+            scene = scene_class()
+            scene.render()
+            return str(scene.renderer.file_writer.movie_file_path)
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Any
+
+
+class Spool:
+    '''
+    Section render jobs kept in a directory shared by every host, a job is a json file
+    moving between state directories with atomic renames:
+
+        pending/   waiting for a worker
+        claimed/   being rendered, the worker touches the file as its heartbeat
+        done/      rendered, the segment is in segments/<project>/
+        failed/    out of attempts
+
+    A claimed job whose heartbeat is older than `lease` seconds is put back in `pending`
+    by whoever notices first (the coordinator or any worker)
+    '''
+
+    states = ('pending', 'claimed', 'done', 'failed')
+
+    def __init__(self, directory: str, lease: float = 60.0) -> None:
+        self.directory = os.path.abspath(directory)
+        self.lease = lease
+        for name in (*Spool.states, 'projects', 'segments', 'plans', 'logs'):
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+
+    def _path(self, state: str, job_id: str) -> str:
+        return os.path.join(self.directory, state, f'{job_id}.json')
+
+    @staticmethod
+    def _write(path: str, data: dict[str, Any]) -> None:
+        temporary = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, indent=4))
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _read(path: str) -> dict[str, Any] | None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.loads(f.read())
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def jobs(self, state: str, project: str | None = None) -> list[str]:
+        names = sorted(name[:-5] for name in os.listdir(os.path.join(self.directory, state)) if name.endswith('.json'))
+        return [name for name in names if project is None or name.startswith(f'{project}-')]
+
+    def submit(
+        self, scene: str, script: str, actions: str, options: list[str] | None = None,
+        optimize: str | None = None, release: bool = False, max_attempts: int = 3
+    ) -> str:
+        '''
+        Copies the project into the spool and queues one job per section range, returns the project id
+
+        A job carries paths relative to the spool and its animation range: the worker
+        writes the scene file for its own mount of the spool, and lets manim fast-forward
+        (skip) every animation before the range. Files the sources refer to are copied
+        along, keeping their path relative to the script (or the working directory)
+        '''
+        import manim_render
+
+        project = f'{scene}-{uuid.uuid4().hex[:8]}'
+        directory = os.path.join(self.directory, 'projects', project)
+        os.makedirs(directory)
+        os.makedirs(os.path.join(self.directory, 'segments', project))
+        for path in manim_render.OutputCache.referenced_files(script, actions):
+            relative = Spool._relative(path, os.path.dirname(os.path.abspath(script)), os.getcwd())
+            if relative is None:
+                sys.stderr.write(f'资源文件 {path} 不在脚本目录或工作目录下，渲染节点需以相同路径访问\n')
+                continue
+            os.makedirs(os.path.dirname(os.path.join(directory, relative)), exist_ok=True)
+            shutil.copyfile(path, os.path.join(directory, relative))
+        script = shutil.copy(script, os.path.join(directory, os.path.basename(script)))
+        actions = shutil.copy(actions, os.path.join(directory, os.path.basename(actions)))
+
+        ranges = manim_render.plan_sections(script, actions, os.path.join(self.directory, 'plans'), optimize)
+        if not ranges:
+            raise manim_render.RenderException(f'`{actions}` has no animation to render')
+        Spool._write(os.path.join(directory, 'project.json'), { 'project': project, 'scene': scene, 'count': len(ranges) })
+        for index, (section, start, end) in enumerate(ranges):
+            job_id = f'{project}-{index:04d}'
+            Spool._write(self._path('pending', job_id), {
+                'id': job_id, 'project': project, 'index': index, 'count': len(ranges), 'scene': scene,
+                'script': os.path.basename(script), 'actions': os.path.basename(actions),
+                'optimize': optimize, 'release': release, 'section': section, 'start': start, 'end': end,
+                'options': options or [], 'attempts': 0, 'max_attempts': max_attempts, 'errors': []
+            })
+        return project
+
+    @staticmethod
+    def _relative(path: str, *bases: str) -> str | None:
+        # `path` relative to the first base containing it
+        for base in bases:
+            relative = os.path.relpath(path, base)
+            if not relative.startswith(os.pardir):
+                return relative
+        return None
+
+    def project_directory(self, project: str) -> str:
+        return os.path.join(self.directory, 'projects', project)
+
+    def segment(self, project: str, index: int) -> str:
+        return os.path.join(self.directory, 'segments', project, f'{index:04d}.mp4')
+
+    def claim(self, worker: str) -> dict[str, Any] | None:
+        '''
+        Takes the first pending job, None when there is nothing to do
+        '''
+        for job_id in self.jobs('pending'):
+            claimed = self._path('claimed', job_id)
+            try:
+                # The rename keeps the mtime, which has to be a fresh heartbeat from the start
+                os.utime(self._path('pending', job_id))
+                os.rename(self._path('pending', job_id), claimed)
+                os.utime(claimed)
+            except FileNotFoundError:
+                # Another worker was faster
+                continue
+            job = Spool._read(claimed)
+            if job is None:
+                continue
+            job['worker'] = worker
+            job['attempts'] += 1
+            Spool._write(claimed, job)
+            return job
+        return None
+
+    def heartbeat(self, job_id: str) -> bool:
+        # False once the job is no longer ours (requeued as stale)
+        try:
+            os.utime(self._path('claimed', job_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job: dict[str, Any], segment: str) -> None:
+        target = self.segment(job['project'], job['index'])
+        temporary = f'{target}.{socket.gethostname()}.{os.getpid()}.tmp'
+        shutil.copyfile(segment, temporary)
+        os.replace(temporary, target)
+        Spool._write(self._path('done', job['id']), job)
+        # A retry queued while this worker looked stale is no longer needed
+        for state in ('claimed', 'pending', 'failed'):
+            try:
+                os.remove(self._path(state, job['id']))
+            except FileNotFoundError:
+                pass
+
+    def fail(self, job: dict[str, Any], error: str) -> str:
+        '''
+        Puts a failed job back in the queue, or in `failed` once out of attempts, returns its new state
+        '''
+        job = { **job, 'errors': [*job['errors'], error] }
+        state = 'failed' if job['attempts'] >= job['max_attempts'] else 'pending'
+        Spool._write(self._path(state, job['id']), job)
+        try:
+            os.remove(self._path('claimed', job['id']))
+        except FileNotFoundError:
+            pass
+        return state
+
+    def requeue_stale(self) -> list[str]:
+        '''
+        Retries claimed jobs whose worker stopped sending heartbeats, returns their ids
+        '''
+        result = []
+        now = time.time()
+        for job_id in self.jobs('claimed'):
+            claimed = self._path('claimed', job_id)
+            try:
+                if now - os.path.getmtime(claimed) < self.lease:
+                    continue
+                # Only one of several concurrent requeuers wins the rename
+                stale = f'{claimed}.{socket.gethostname()}.{os.getpid()}.stale'
+                os.rename(claimed, stale)
+            except FileNotFoundError:
+                continue
+            job = Spool._read(stale)
+            os.remove(stale)
+            if job is not None:
+                self.fail(job, f'lease expired on {job.get("worker")}')
+                result.append(job_id)
+        return result
+
+    def status(self, project: str | None = None) -> dict[str, int]:
+        return { state: len(self.jobs(state, project)) for state in Spool.states }
+
+    def wait(self, project: str, output: str, poll: float = 1.0) -> str:
+        '''
+        Waits for every job of `project`, retries stale ones and stitches the segments into `output`
+        '''
+        import manim_render
+
+        count = Spool._read(os.path.join(self.project_directory(project), 'project.json'))['count']
+        reported = None
+        while True:
+            self.requeue_stale()
+            status = self.status(project)
+            if status != reported:
+                sys.stderr.write(
+                    f'分布式渲染：等待 {status["pending"]} 个，渲染中 {status["claimed"]} 个，'
+                    f'完成 {status["done"]} 个，失败 {status["failed"]} 个\n'
+                )
+                reported = status
+            if status['failed']:
+                failed = [Spool._read(self._path('failed', job_id)) for job_id in self.jobs('failed', project)]
+                raise manim_render.RenderException(
+                    f'{len(failed)} section(s) failed: ' + '; '.join(f'{job["section"]}: {job["errors"][-1]}' for job in failed if job)
+                )
+            # A job being requeued is briefly in no state directory, only `count` tells it is missing
+            if status['done'] == count:
+                break
+            time.sleep(poll)
+
+        return manim_render.concat_videos([self.segment(project, index) for index in range(count)], output)
+
+
+def work(spool: Spool, idle: float | None = None, poll: float = 1.0) -> int:
+    '''
+    Renders jobs of the spool until interrupted (or idle for `idle` seconds), returns the number rendered
+    '''
+    import manim_render
+
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    rendered = 0
+    last = time.time()
+    sys.stderr.write(f'渲染节点 {worker} 已启动：{spool.directory}\n')
+    while True:
+        spool.requeue_stale()
+        job = spool.claim(worker)
+        if job is None:
+            if idle is not None and time.time() - last > idle:
+                return rendered
+            time.sleep(poll)
+            continue
+
+        sys.stderr.write(f'  {worker} 渲染 {job["id"]}：{job["section"]}（动画 {job["start"]}-{job["end"] - 1}，第 {job["attempts"]} 次）\n')
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(spool.lease / 3) and spool.heartbeat(job['id']):
+                pass
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+        workspace = tempfile.mkdtemp(prefix=f'{job["id"]}-')
+        try:
+            # Written on every host so that it points at this host's spool mount and helper
+            directory = spool.project_directory(job['project'])
+            filename = manim_render.write_scene(
+                os.path.join(workspace, f'{job["scene"]}.py'), job['scene'],
+                os.path.join(directory, job['script']), os.path.join(directory, job['actions']),
+                plan_cache=os.path.join(spool.directory, 'plans'), optimize=job['optimize'], release=job['release']
+            )
+            segment = manim_render.render_range(
+                filename, job['scene'], job['start'], job['end'], f'part_{job["index"]}', os.path.join(workspace, 'media'),
+                job['options'], os.path.join(spool.directory, 'logs', f'{job["id"]}.{job["attempts"]}.log'), directory
+            )
+            spool.complete(job, segment)
+            rendered += 1
+        except Exception as e:
+            state = spool.fail(job, f'{type(e).__name__}: {e}')
+            sys.stderr.write(f'  {worker} 渲染 {job["id"]} 失败（{"将重试" if state == "pending" else "不再重试"}）：{e}\n')
+        finally:
+            stop.set()
+            heart.join()
+            shutil.rmtree(workspace, ignore_errors=True)
+        last = time.time()
+
+
+def start_local_workers(directory: str, count: int, lease: float) -> list[subprocess.Popen]:
+    # Workers on this machine, the same command runs them on any host sharing `directory`
+    command = [sys.executable, os.path.abspath(__file__), 'work', directory, '--lease', str(lease)]
+    return [subprocess.Popen(command) for _ in range(count)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='manim-helper distributed render spool')
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker_parser = commands.add_parser('work', help='render jobs from a spool directory')
+    worker_parser.add_argument('spool', help='spool directory shared by the coordinator and every worker')
+    worker_parser.add_argument('--lease', type=float, default=60.0, help='seconds without heartbeat before a job is retried')
+    worker_parser.add_argument('--idle', type=float, default=None, metavar='SECONDS', help='exit after being idle this long')
+    status_parser = commands.add_parser('status', help='count the jobs in every state')
+    status_parser.add_argument('spool')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print(json.dumps(Spool(args.spool).status(), ensure_ascii=False))
+    else:
+        try:
+            work(Spool(args.spool, args.lease), args.idle)
+        except KeyboardInterrupt:
+            pass
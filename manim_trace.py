@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import atexit
+import threading
+from typing import Any
+
+
+class _NullSpan:
+    # Shared by every disabled span, entering and leaving it does nothing
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+    def annotate(self, **_: Any) -> None:
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class Span:
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter() - self.start, self.args)
+
+    def annotate(self, **args: Any) -> None:
+        self.args.update(args)
+
+
+class Tracer:
+    '''
+    Records timed spans (json load, object construction, plan building, play calls,
+    updaters) when enabled, disabled spans cost one attribute check
+
+    Setting `MANIM_HELPER_TRACE=<path>` enables tracing for the whole process and writes
+    `<path>` (plain json) and `<path>.chrome.json` (chrome trace events) when it exits,
+    `{pid}` in the path is replaced so that several processes can trace at once
+    '''
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.spans: list[dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans = []
+
+    def span(self, name: str, category: str = 'helper', **args: Any) -> Span | _NullSpan:
+        if not self.enabled:
+            return _null_span
+        return Span(self, name, category, args)
+
+    def record(self, name: str, category: str, start: float, duration: float, args: dict[str, Any] | None = None) -> None:
+        span = {
+            'name': name,
+            'category': category,
+            'start': start - self._origin,
+            'duration': duration,
+            'thread': threading.get_ident(),
+            'args': args or {}
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        # Total time and count per category
+        result: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            item = result.setdefault(span['category'], { 'count': 0, 'seconds': 0.0 })
+            item['count'] += 1
+            item['seconds'] += span['duration']
+        return result
+
+    def export_json(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({ 'spans': self.spans, 'summary': self.summary() }, ensure_ascii=False, default=repr))
+
+    def export_chrome(self, path: str) -> None:
+        pid = os.getpid()
+        events = [{
+            'name': span['name'],
+            'cat': span['category'],
+            'ph': 'X',
+            'ts': span['start'] * 1e6,
+            'dur': span['duration'] * 1e6,
+            'pid': pid,
+            'tid': span['thread'],
+            'args': span['args']
+        } for span in self.spans]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, ensure_ascii=False, default=repr))
+
+    def export(self, path: str) -> None:
+        self.export_json(path)
+        self.export_chrome(f'{path}.chrome.json')
+
+
+tracer = Tracer()
+
+if os.environ.get('MANIM_HELPER_TRACE'):
+    tracer.enable()
+    atexit.register(tracer.export, os.path.abspath(os.environ['MANIM_HELPER_TRACE'].replace('{pid}', str(os.getpid()))))
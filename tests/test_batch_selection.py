@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manim_helper
+
+
+def compile_selection(tmp_path, **config) -> manim_helper.Director:
+    manager = manim_helper.MObjectManager(lazy=True)
+    manager.add_objects([('a_1', 'a'), ('a_2', 'b'), ('a_3', 'c')])
+    actions = tmp_path / 'actions.json'
+    actions.write_text(json.dumps({ 's': [{
+        'action': 'select', 'target': 'a_{}', 'params': [1, 2, 3], 'properties': { 'action': 'write' }, **config
+    }] }))
+    director = manim_helper.Director(manager, str(actions))
+    director.load_actions()
+    director.compile()
+    return director
+
+
+@pytest.mark.parametrize('config', [{}, { 'batch': False }])
+def test_selection_without_batch_plays_one_step_per_target(tmp_path, config):
+    assert [step.node.action for step in compile_selection(tmp_path, **config).plan.steps] == ['write'] * 3
+
+
+@pytest.mark.parametrize('batch, groups', [(True, [3]), (2, [2, 1])])
+def test_batched_selection_plays_groups(tmp_path, batch, groups):
+    plan = compile_selection(tmp_path, batch=batch, lag=0.5).plan.steps
+    assert [step.node.action for step in plan] == ['lagged'] * len(groups)
+    assert [len(step.node.children) for step in plan] == groups
+
+
+@pytest.mark.parametrize('config', [{ 'lag': 0.5 }, { 'duration': 2 }, { 'batch': False, 'lag': 0.5 }])
+def test_selection_settings_need_batch(tmp_path, config):
+    with pytest.raises(manim_helper.Director.PlanException) as e:
+        compile_selection(tmp_path, **config)
+    assert 'needs `batch`' in str(e.value.errors)
+
+
+def test_selection_rejects_unknown_config(tmp_path):
+    with pytest.raises(manim_helper.Director.PlanException) as e:
+        compile_selection(tmp_path, durtion=2)
+    assert 'Config `durtion` is invalid' in str(e.value.errors)
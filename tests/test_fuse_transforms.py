@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manim_helper
+
+
+class FakeMobject:
+    '''
+    The point handling of a manim mobject: shift, and scale and rotate about the bounding box center
+    '''
+
+    def __init__(self, points: np.ndarray) -> None:
+        self.points = points.copy()
+
+    def get_all_points(self) -> np.ndarray:
+        return self.points
+
+    def get_center(self) -> np.ndarray:
+        return (self.points.min(axis=0) + self.points.max(axis=0)) / 2
+
+    def apply_points_function_about_point(self, function, about_point) -> 'FakeMobject':
+        self.points = function(self.points - about_point) + about_point
+        return self
+
+    def shift(self, vector) -> 'FakeMobject':
+        self.points = self.points + np.asarray(vector, dtype=np.float64)
+        return self
+
+    def scale(self, factor) -> 'FakeMobject':
+        return self.apply_points_function_about_point(lambda p: p * factor, self.get_center())
+
+    def rotate(self, angle) -> 'FakeMobject':
+        cos, sin = math.cos(angle), math.sin(angle)
+        matrix = np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]])
+        return self.apply_points_function_about_point(lambda p: p @ matrix.T, self.get_center())
+
+
+def random_operation(rng: random.Random) -> tuple[str, list]:
+    method = rng.choice(('shift', 'scale', 'rotate'))
+    if method == 'shift':
+        return method, [[rng.uniform(-3, 3), rng.uniform(-3, 3), 0.0]]
+    if method == 'scale':
+        return method, [rng.choice((rng.uniform(0.2, 3), [rng.uniform(0.2, 3), rng.uniform(0.2, 3), 1.0]))]
+    return method, [rng.uniform(-math.pi, math.pi)]
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_fused_transforms_match_sequential_calls(seed):
+    rng = random.Random(seed)
+    points = np.array([[rng.uniform(-2, 2), rng.uniform(-2, 2), 0.0] for _ in range(rng.randint(1, 12))])
+    operations = [random_operation(rng) for _ in range(rng.randint(1, 6))]
+
+    expected = FakeMobject(points)
+    for method, params in operations:
+        getattr(expected, method)(*params)
+    fused = manim_helper.Director._fuse_transforms(operations)(FakeMobject(points))
+
+    assert np.allclose(fused.points, expected.points, atol=1e-9)
+
+
+def test_fusing_keeps_empty_mobjects():
+    mobject = FakeMobject(np.zeros((0, 3)))
+    assert manim_helper.Director._fuse_transforms([('scale', [2]), ('rotate', [1])])(mobject) is mobject
+
+
+def test_async_controller_rejects_other_animations_when_compiled(tmp_path):
+    manager = manim_helper.MObjectManager(lazy=True)
+    manager.add_objects([('a', 'a'), ('b', 'b')])
+    actions = tmp_path / 'actions.json'
+    actions.write_text(json.dumps({ 's': [{
+        'action': 'parallel', 'async': True,
+        'params': [{ 'action': 'shift', 'target': 'a', 'params': ['UP'] }, { 'action': 'write', 'target': 'b' }]
+    }] }))
+    director = manim_helper.Director(manager, str(actions))
+    director.load_actions()
+
+    with pytest.raises(manim_helper.Director.PlanException) as e:
+        director.compile()
+    assert 'asynchronously' in str(e.value.errors)
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manim_helper
+
+
+def compile_plan(tmp_path, objects: list[tuple[str, object]], actions: dict[str, list]) -> manim_helper.Director:
+    manager = manim_helper.MObjectManager(lazy=True)
+    manager.add_objects(objects)
+    path = tmp_path / 'actions.json'
+    path.write_text(json.dumps(actions))
+    director = manim_helper.Director(manager, str(path))
+    director.load_actions()
+    director.compile()
+    return director
+
+
+def test_objects_are_released_after_their_last_vanishing_use(tmp_path):
+    director = compile_plan(tmp_path, [('a', 'a'), ('b', 'b'), ('c', 'c')], { 's': [
+        { 'action': 'write', 'target': 'a' }, { 'action': 'write', 'target': 'b' },
+        { 'action': 'fadeout', 'target': 'a' }, { 'action': 'transform', 'target': 'b', 'params': ['$c'] }
+    ] })
+    # `c` is still shown once `b` has turned into it
+    assert director.liveness() == { 2: ['a'], 3: ['b'] }
+
+
+def test_objects_used_again_are_not_released(tmp_path):
+    director = compile_plan(tmp_path, [('a', 'a')], { 's': [
+        { 'action': 'write', 'target': 'a' }, { 'action': 'fadeout', 'target': 'a' }, { 'action': 'write', 'target': 'a' }
+    ] })
+    assert director.liveness() == {}
+
+
+def test_groups_release_their_members(tmp_path):
+    director = compile_plan(tmp_path, [('a', 'a'), ('b', 'b'), ('g', ['a', 'b'])], { 's': [
+        { 'action': 'write', 'target': 'g' }, { 'action': 'fadeout', 'target': 'g' }
+    ] })
+    assert director.liveness() == { 1: ['a', 'b', 'g'] }
+
+
+def test_updater_references_live_as_long_as_the_updated_object(tmp_path):
+    director = compile_plan(tmp_path, [
+        ('a', 'a'), ('b', 'b'),
+        ('d', { 'type': 'dot', 'associate': "this.move_to(this.find('a'))" }),
+        ('e', { 'type': 'dot', 'associate': "this.move_to(this.find('b'))" })
+    ], { 's': [
+        { 'action': 'add', 'target': 'd' }, { 'action': 'add', 'target': 'e' },
+        { 'action': 'fadeout', 'target': 'a' }, { 'action': 'fadeout', 'target': 'b' }, { 'action': 'fadeout', 'target': 'd' }
+    ] })
+    # `a` waits for `d`, `b` is read by `e` until the end
+    assert director.liveness() == { 4: ['a', 'd'] }
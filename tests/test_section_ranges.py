@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manim_helper
+import manim_render
+
+
+def compile_plan(tmp_path, actions: dict[str, list], objects=(('a', 'a'), ('b', 'b'), ('c', 'c'))) -> manim_helper.Director:
+    manager = manim_helper.MObjectManager(lazy=True)
+    manager.add_objects(objects)
+    path = tmp_path / 'actions.json'
+    path.write_text(json.dumps(actions))
+    director = manim_helper.Director(manager, str(path))
+    director.load_actions()
+    director.compile()
+    return director
+
+
+def test_sections_with_only_add_join_the_next_section(tmp_path):
+    plan = compile_plan(tmp_path, {
+        'one': [{ 'action': 'write', 'target': 'a' }, { 'action': 'wait', 'params': [1] }],
+        'two': [{ 'action': 'add', 'target': 'b' }],
+        'three': [{ 'action': 'add', 'target': 'c' }, { 'action': 'fadeout', 'target': 'b' }]
+    }).plan
+    ranges = manim_render.section_ranges(plan)
+    assert ranges == [('one', 0, 2), ('two+three', 2, 3)]
+    assert [[step.kind for step in steps] for steps in manim_render.range_steps(plan, ranges)] == [
+        ['play', 'wait'], ['add', 'add', 'play']
+    ]
+
+
+def test_trailing_add_only_sections_are_dropped(tmp_path):
+    plan = compile_plan(tmp_path, {
+        'one': [{ 'action': 'write', 'target': 'a' }],
+        'two': [{ 'action': 'add', 'target': 'b' }]
+    }).plan
+    ranges = manim_render.section_ranges(plan)
+    assert ranges == [('one', 0, 1)]
+    # The trailing `add` still plays, at the end of the last range
+    assert [[step.kind for step in steps] for steps in manim_render.range_steps(plan, ranges)] == [['play', 'add']]
+
+
+def test_plans_without_animation_have_no_range(tmp_path):
+    assert manim_render.section_ranges(compile_plan(tmp_path, { 'one': [{ 'action': 'add', 'target': 'a' }] }).plan) == []
+
+
+def test_updaters_keep_the_scene_in_one_range(tmp_path):
+    director = compile_plan(tmp_path, {
+        'one': [{ 'action': 'write', 'target': 'a' }],
+        'two': [{ 'action': 'add', 'target': 'd' }, { 'action': 'write', 'target': 'b' }]
+    }, (('a', 'a'), ('b', 'b'), ('d', { 'type': 'dot', 'associate': 'this.rotate(0.02)' })))
+    assert manim_render.section_ranges(director.plan) == [('one', 0, 1), ('two', 1, 2)]
+    assert manim_render.director_ranges(director) == [('one+two', 0, 2)]
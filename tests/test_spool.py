@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manim_render
+import manim_spool
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'script.json').write_text(json.dumps({ 'a': 'a', 'b': 'b' }))
+    (tmp_path / 'actions.json').write_text(json.dumps({
+        'one': [{ 'action': 'write', 'target': 'a' }],
+        'two': [{ 'action': 'add', 'target': 'b' }],
+        'three': [{ 'action': 'write', 'target': 'b' }]
+    }))
+    spool = manim_spool.Spool(str(tmp_path / 'spool'), lease=10)
+    return spool, spool.submit('S', 'script.json', 'actions.json', max_attempts=2)
+
+
+def expire(spool: manim_spool.Spool, job_id: str) -> None:
+    path = os.path.join(spool.directory, 'claimed', f'{job_id}.json')
+    os.utime(path, (time.time() - spool.lease - 1,) * 2)
+
+
+def test_submit_queues_one_job_per_range(project):
+    spool, name = project
+    # `two` only adds an object, it goes with the following section
+    assert [spool.claim('w')['section'] for _ in range(2)] == ['one', 'two+three']
+    assert spool.claim('w') is None
+    assert spool.status(name) == { 'pending': 0, 'claimed': 2, 'done': 0, 'failed': 0 }
+
+
+def test_claim_starts_a_fresh_lease(project):
+    spool, _ = project
+    job = spool.claim('w')
+    assert job['worker'] == 'w' and job['attempts'] == 1
+    assert spool.requeue_stale() == []
+
+
+def test_stale_jobs_are_retried_then_failed(project):
+    spool, name = project
+    job = spool.claim('w')
+    expire(spool, job['id'])
+    assert spool.requeue_stale() == [job['id']]
+    assert spool.status(name)['pending'] == 2
+
+    job = spool.claim('w')
+    assert job['attempts'] == 2
+    expire(spool, job['id'])
+    spool.requeue_stale()
+    assert spool.jobs('failed', name) == [job['id']]
+    assert spool.claim('w')['index'] == 1
+
+
+def test_complete_drops_a_requeued_copy(project, tmp_path):
+    spool, name = project
+    job = spool.claim('w')
+    expire(spool, job['id'])
+    spool.requeue_stale()
+    segment = tmp_path / 'segment.mp4'
+    segment.write_text('video')
+    spool.complete(job, str(segment))
+    assert spool.status(name) == { 'pending': 1, 'claimed': 0, 'done': 1, 'failed': 0 }
+    assert os.path.exists(spool.segment(name, 0))
+
+
+def test_wait_stitches_once_every_section_is_done(project, tmp_path, monkeypatch):
+    spool, name = project
+    segment = tmp_path / 'segment.mp4'
+    segment.write_text('video')
+    first, second = spool.claim('w'), spool.claim('w')
+    spool.complete(first, str(segment))
+    # The second job is being requeued, in no state directory at all
+    os.remove(os.path.join(spool.directory, 'claimed', f'{second["id"]}.json'))
+
+    polls = []
+    monkeypatch.setattr(manim_spool.time, 'sleep', lambda _: polls.append(1) or spool.complete(second, str(segment)))
+    stitched = []
+    monkeypatch.setattr(manim_render, 'concat_videos', lambda parts, output: stitched.append(parts) or output)
+    assert spool.wait(name, 'out.mp4', poll=0) == 'out.mp4'
+    assert polls and stitched == [[spool.segment(name, 0), spool.segment(name, 1)]]
+
+
+def test_wait_reports_failed_sections(project):
+    spool, name = project
+    job = spool.claim('w')
+    job['attempts'] = job['max_attempts']
+    spool.fail(job, 'boom')
+    with pytest.raises(manim_render.RenderException, match='one: boom'):
+        spool.wait(name, 'out.mp4', poll=0)